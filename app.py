@@ -1,8 +1,18 @@
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import os
 from pathlib import Path
-from modules.processor import AudioVideoProcessor
-from modules.translator import Translator
+# processor 只在模組層級匯入輕量部分，whisper/torch 與模型延後到背景預熱時才載入
+from modules.processor import AudioVideoProcessor, VIDEO_SUFFIXES
+from modules.workspace import JobWorkspace, WorkspaceJanitor
+from modules.checkpoint import CHECKPOINT_ROOT
+from modules.transcript_index import TranscriptFile, TranscriptIndex, split_paragraphs
+from modules.subtitle_writer import format_timestamp
+from dotenv import load_dotenv
+
+_import_seconds = time.perf_counter() - _script_start
 
 # 設定頁面配置
 st.set_page_config(
@@ -11,20 +21,76 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 初始化目錄
-input_dir = Path("input")
-output_dir = Path("output")
+# 初始化目錄；每個 session 的輸入、暫存與輸出檔案放在 workspace/<工作 ID>/ 下
+workspace_dir = Path("workspace")
 model_dir = Path("model")
-temp_dir = Path("temp")
 ffmpeg_dir = Path("ffmpeg/bin")
 
 # 創建必要的目錄
-for directory in [input_dir, output_dir, model_dir, temp_dir, ffmpeg_dir]:
+for directory in [workspace_dir, model_dir, ffmpeg_dir]:
     directory.mkdir(parents=True, exist_ok=True)
 
-# 創建輸出子目錄
-(output_dir / "transcripts").mkdir(exist_ok=True)
-(output_dir / "subtitles").mkdir(exist_ok=True)
+# 工作目錄的保存時間與總磁碟用量上限
+load_dotenv()
+WORKSPACE_TTL_SECONDS = int(os.getenv("WORKSPACE_TTL_SECONDS", 6 * 3600))
+WORKSPACE_MAX_BYTES = int(os.getenv("WORKSPACE_MAX_MB", 10 * 1024)) * 1024 ** 2
+
+# 字幕輸出格式選項
+SUBTITLE_FORMAT_LABELS = {
+    "srt": "中文字幕檔 (SRT)",
+    "srt_bilingual": "雙語字幕檔 (SRT)",
+    "vtt": "中文字幕檔 (VTT)",
+    "vtt_bilingual": "雙語字幕檔 (VTT)",
+    "json": "字幕片段 (JSON)",
+    "txt": "純文字 (TXT)",
+}
+
+# 逐字稿每頁顯示的段落數與搜尋結果顯示上限
+PARAGRAPHS_PER_PAGE = 30
+SEARCH_RESULTS_LIMIT = 20
+
+@st.cache_resource
+def get_processor():
+    """所有 session 共用同一個處理器，並在背景預熱 FFmpeg 與 Whisper 模型"""
+    processor = AudioVideoProcessor()
+    processor.warm_up_in_background()
+    return processor
+
+@st.cache_resource
+def get_janitor():
+    """啟動背景清理程式，定期刪除過期或超出配額的工作目錄與中斷工作留下的檢查點
+
+    刪除工作目錄時一併移除搜尋索引中指向該目錄逐字稿的結果
+    """
+    search_index = get_processor().search_index
+    return WorkspaceJanitor(workspace_dir, WORKSPACE_TTL_SECONDS, WORKSPACE_MAX_BYTES,
+                            checkpoint_root=CHECKPOINT_ROOT,
+                            on_remove=search_index.remove_recordings_under).start()
+
+@st.cache_resource
+def startup_metrics():
+    """記錄第一次執行時的匯入與首次繪製時間，所有 session 共用"""
+    return {}
+
+def render_status(processor):
+    """在側邊欄顯示模型狀態與啟動時間"""
+    if processor.ready.is_set():
+        st.sidebar.success("模型已就緒")
+    elif processor.warm_up_error is not None:
+        st.sidebar.error(f"模型載入失敗：{str(processor.warm_up_error)}")
+    else:
+        st.sidebar.info("模型於背景載入中，可先選擇選項與上傳檔案")
+
+    metrics = startup_metrics()
+    first_paint_seconds = time.perf_counter() - _script_start
+    if "first_paint_seconds" not in metrics:
+        metrics["import_seconds"] = _import_seconds
+        metrics["first_paint_seconds"] = first_paint_seconds
+        print(f"冷啟動：模組匯入 {_import_seconds:.3f} 秒，首次繪製 {first_paint_seconds:.3f} 秒")
+    st.sidebar.caption(
+        f"冷啟動：模組匯入 {metrics['import_seconds']:.3f} 秒，首次繪製 {metrics['first_paint_seconds']:.3f} 秒  \n"
+        f"本次繪製：{first_paint_seconds:.3f} 秒"
+    )
 
 def initialize_session_state():
     """初始化 session state"""
@@ -38,58 +104,99 @@ def initialize_session_state():
         st.session_state.subtitle_path = None
     if 'bilingual_subtitle_path' not in st.session_state:
         st.session_state.bilingual_subtitle_path = None
+    if 'subtitle_paths' not in st.session_state:
+        st.session_state.subtitle_paths = {}
     if 'input_path' not in st.session_state:
         st.session_state.input_path = None
+    if 'workspace' not in st.session_state:
+        st.session_state.workspace = JobWorkspace(workspace_dir)
     if 'uploader_key' not in st.session_state:
         st.session_state.uploader_key = 0
     if 'transcript' not in st.session_state:
         st.session_state.transcript = None
+    if 'transcript_file' not in st.session_state:
+        st.session_state.transcript_file = None
     # 預設選項設置
     if 'generate_transcript' not in st.session_state:
         st.session_state.generate_transcript = True
     if 'generate_subtitles' not in st.session_state:
         st.session_state.generate_subtitles = False
 
-def process_file(uploaded_file, progress_bar, status_text, generate_transcript, generate_subtitles):
+def process_file(uploaded_file, progress_bar, status_text, generate_transcript, generate_subtitles,
+                 subtitle_formats=("srt", "srt_bilingual"), streaming=False):
     """處理上傳的檔案"""
     try:
-        # 初始化處理器
-        processor = AudioVideoProcessor()
-        translator = Translator()
-        
-        # 將上傳的檔案保存到 input 目錄
-        input_path = Path("input") / uploaded_file.name
-        with open(input_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # 取得共用處理器；模型若仍在背景載入，第一次辨識時會等待載入完成
+        processor = get_processor()
+        if not processor.ready.is_set():
+            status_text.text("等待模型載入完成...")
         
-        if not input_path.exists():
-            raise Exception(f"檔案保存失敗：{input_path}")
+        # 確認暫存空間足夠（上傳檔案加上提取出的音訊與輸出檔）
+        get_janitor().ensure_capacity(uploaded_file.size * 3)
+
+        # 使用此 session 專屬的工作目錄，處理期間不會被清理
+        workspace = st.session_state.workspace
+        with workspace.in_use():
+            # 將上傳的檔案保存到工作目錄的 input 目錄
+            input_path = workspace.input_dir / uploaded_file.name
+            with open(input_path, "wb") as f:
+                f.write(uploaded_file.getbuffer())
             
-        st.session_state.input_path = input_path
-        print(f"檔案已保存到：{input_path}")
-        
-        # 處理檔案
-        status_text.text("正在處理檔案...")
-        progress_bar.progress(25)
-
-        # 如果選擇生成逐字稿
-        if generate_transcript:
-            # 執行語音辨識
-            print("開始執行語音辨識...")
-            status_text.text("正在執行語音辨識...")
-            transcription = processor.transcribe_audio(str(input_path))
-            st.session_state.transcript = transcription
-            print("語音辨識完成")
-            progress_bar.progress(50)
-
-
-        # 如果選擇生成字幕且檔案是影片
-        if generate_subtitles and uploaded_file.type.startswith('video'):
-            status_text.text("正在生成字幕...")
-            subtitle_path, bilingual_subtitle_path = processor.generate_subtitles(str(input_path))
-            st.session_state.subtitle_path = subtitle_path
-            st.session_state.bilingual_subtitle_path = bilingual_subtitle_path
-            progress_bar.progress(75)
+            if not input_path.exists():
+                raise Exception(f"檔案保存失敗：{input_path}")
+                
+            st.session_state.input_path = input_path
+            print(f"檔案已保存到：{input_path}")
+            
+            # 處理檔案
+            status_text.text("正在處理檔案...")
+            progress_bar.progress(25)
+
+            make_subtitles = generate_subtitles and uploaded_file.type.startswith('video')
+
+            # 長時間錄音模式：一次辨識，逐窗寫出逐字稿與字幕
+            if streaming:
+                status_text.text("正在以長時間錄音模式處理...")
+                outputs = processor.process_streaming(
+                    str(input_path), subtitle_formats if make_subtitles else None,
+                    generate_transcript, workspace
+                )
+                if outputs["transcript"]:
+                    # 逐字稿留在磁碟上分頁讀取，不整份載入記憶體
+                    st.session_state.transcript = None
+                    st.session_state.pop('transcript_view', None)
+                    st.session_state.transcript_file = TranscriptFile(outputs["transcript"],
+                                                                      processor.search_index)
+                    st.session_state.transcript_page = 1
+                subtitle_paths = outputs["subtitles"]
+                st.session_state.subtitle_paths = subtitle_paths
+                st.session_state.subtitle_path = subtitle_paths.get("srt") or next(iter(subtitle_paths.values()), None)
+                st.session_state.bilingual_subtitle_path = subtitle_paths.get("srt_bilingual")
+                progress_bar.progress(75)
+
+            # 如果選擇生成逐字稿
+            elif generate_transcript:
+                # 執行語音辨識
+                print("開始執行語音辨識...")
+                status_text.text("正在執行語音辨識...")
+                # 接著要生成字幕時保留辨識結果，字幕不需重新辨識
+                transcription = processor.transcribe_audio(str(input_path), workspace,
+                                                           keep_recognition=make_subtitles)
+                st.session_state.transcript = transcription
+                st.session_state.transcript_file = None
+                st.session_state.transcript_page = 1
+                print("語音辨識完成")
+                progress_bar.progress(50)
+
+
+            # 如果選擇生成字幕且檔案是影片
+            if make_subtitles and not streaming:
+                status_text.text("正在生成字幕...")
+                subtitle_paths = processor.export_subtitles(str(input_path), subtitle_formats, workspace)
+                st.session_state.subtitle_paths = subtitle_paths
+                st.session_state.subtitle_path = subtitle_paths.get("srt") or next(iter(subtitle_paths.values()), None)
+                st.session_state.bilingual_subtitle_path = subtitle_paths.get("srt_bilingual")
+                progress_bar.progress(75)
 
         st.session_state.processed = True
         progress_bar.progress(100)
@@ -101,29 +208,105 @@ def process_file(uploaded_file, progress_bar, status_text, generate_transcript,
         st.error(f"處理過程中發生錯誤：{str(e)}")
         return False
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_download_payload(path, mtime):
+    """讀取下載檔案內容；以路徑與修改時間作為快取鍵，檔案未變動時不重新讀取"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def has_transcript():
+    transcript_file = st.session_state.transcript_file
+    if transcript_file is not None and not transcript_file.path.exists():
+        # 工作目錄過期後已被清理程式刪除
+        st.session_state.transcript_file = None
+        st.warning("逐字稿已過期並被清除，請重新處理檔案")
+    return bool(st.session_state.transcript) or st.session_state.transcript_file is not None
+
+def get_transcript_view():
+    """返回逐字稿的段落索引與下載內容，只在逐字稿變動時重新建立
+
+    長時間錄音模式的逐字稿以 TranscriptFile 直接從磁碟分頁與搜尋
+    """
+    transcript_file = st.session_state.transcript_file
+    if transcript_file is not None:
+        path = transcript_file.path
+        return {
+            'index': transcript_file,
+            'payload': load_download_payload(str(path), path.stat().st_mtime),
+        }
+
+    view = st.session_state.get('transcript_view')
+    if view is None or view['source'] is not st.session_state.transcript:
+        view = {
+            'source': st.session_state.transcript,
+            'index': TranscriptIndex.from_text(st.session_state.transcript),
+            'payload': st.session_state.transcript.encode("utf-8"),
+        }
+        st.session_state.transcript_view = view
+    return view
+
+def go_to_page(page):
+    st.session_state.transcript_page = page
+
+def display_transcript():
+    """分頁顯示逐字稿，每次重新執行只送出目前頁面的段落"""
+    index = get_transcript_view()['index']
+    page_count = max(1, -(-len(index) // PARAGRAPHS_PER_PAGE))
+
+    st.markdown("### 轉換結果")
+
+    # 以預先建立的索引搜尋，點選結果跳到該段落所在頁面
+    query = st.text_input("搜尋逐字稿", key="transcript_query")
+    if query:
+        matches = index.search(query)
+        st.caption(f"找到 {len(matches)} 個段落")
+        for match in matches[:SEARCH_RESULTS_LIMIT]:
+            page = match // PARAGRAPHS_PER_PAGE + 1
+            snippet = index.get_paragraphs(match, match + 1)[0].replace('\n', ' ')
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.text(snippet[:120] + ("…" if len(snippet) > 120 else ""))
+            with col2:
+                st.button(f"第 {page} 頁", key=f"goto_{match}", on_click=go_to_page, args=(page,))
+
+    if st.session_state.get('transcript_page', 1) > page_count:
+        st.session_state.transcript_page = page_count
+    page = st.number_input(f"頁碼（共 {page_count} 頁）", min_value=1, max_value=page_count,
+                           step=1, key="transcript_page")
+    start = (page - 1) * PARAGRAPHS_PER_PAGE
+    end = start + PARAGRAPHS_PER_PAGE
+    page_paragraphs = index.get_paragraphs(start, end)
+
+    # 使用 markdown 來正確顯示換行
+    st.markdown('\n\n'.join(page_paragraphs).replace('\n', '  \n'))
+
+    # 為了編輯和複製方便，也提供一個可展開的文本區域（只包含目前頁面）
+    with st.expander("展開文本編輯區"):
+        page_text = '\n\n'.join(page_paragraphs)
+        edited_text = st.text_area(
+            f"您可以在這裡編輯第 {page} 頁的文本",
+            page_text,
+            height=300
+        )
+
+        # 如果文本被編輯，更新 session state；磁碟上的逐字稿直接改寫檔案
+        edited_paragraphs = split_paragraphs(edited_text)
+        if edited_paragraphs != page_paragraphs:
+            if isinstance(index, TranscriptFile):
+                index.replace_paragraphs(start, end, edited_paragraphs)
+            else:
+                st.session_state.transcript = '\n\n'.join(
+                    index.paragraphs[:start] + edited_paragraphs + index.paragraphs[end:]
+                )
+
 def display_results(generate_transcript, generate_subtitles):
     """顯示處理結果和下載按鈕"""
     if not st.session_state.processed:
         return
 
     # 如果有生成逐字稿，顯示文字結果
-    if generate_transcript and st.session_state.transcript:
-        st.markdown("### 轉換結果")
-        # 使用 markdown 來正確顯示換行
-        formatted_transcript = st.session_state.transcript.replace('\n', '  \n')
-        st.markdown(formatted_transcript)
-        
-        # 為了編輯和複製方便，也提供一個可展開的文本區域
-        with st.expander("展開文本編輯區"):
-            edited_transcript = st.text_area(
-                "您可以在這裡編輯文本",
-                st.session_state.transcript,
-                height=300
-            )
-            
-            # 如果文本被編輯，更新 session state
-            if edited_transcript != st.session_state.transcript:
-                st.session_state.transcript = edited_transcript
+    if generate_transcript and has_transcript():
+        display_transcript()
 
     # 建立下載按鈕區域
     if generate_transcript or (generate_subtitles and st.session_state.subtitle_path):
@@ -131,40 +314,62 @@ def display_results(generate_transcript, generate_subtitles):
         col_index = 0
 
         # 如果有生成逐字稿，顯示下載按鈕
-        if generate_transcript and st.session_state.transcript:
+        if generate_transcript and has_transcript():
             with cols[col_index]:
                 st.download_button(
                     label="下載逐字稿",
-                    data=st.session_state.transcript,
+                    data=get_transcript_view()['payload'],
                     file_name=f"{st.session_state.input_path.stem}_transcript.txt",
                     mime="text/plain"
                 )
             col_index += 1
     
-        # 如果有生成字幕檔，提供下載
-        if generate_subtitles and st.session_state.subtitle_path and Path(st.session_state.subtitle_path).exists():
-            with open(st.session_state.subtitle_path, "r", encoding="utf-8") as f:
-                subtitle_content = f.read()
-            with cols[col_index]:
-                st.download_button(
-                    label="下載中文字幕檔",
-                    data=subtitle_content,
-                    file_name=f"{st.session_state.input_path.stem}_subtitle.srt",
-                    mime="text/plain"
-                )
-            col_index += 1
-    
-            # 如果有雙語字幕檔，提供下載
-            if st.session_state.bilingual_subtitle_path and Path(st.session_state.bilingual_subtitle_path).exists():
-                with open(st.session_state.bilingual_subtitle_path, "r", encoding="utf-8") as f:
-                    bilingual_subtitle_content = f.read()
-                with cols[col_index]:
+        # 如果有生成字幕檔，逐一提供各格式下載
+        if generate_subtitles and st.session_state.subtitle_path:
+            for fmt, path in st.session_state.subtitle_paths.items():
+                if not Path(path).exists():
+                    continue
+                subtitle_content = load_download_payload(path, Path(path).stat().st_mtime)
+                with cols[col_index % len(cols)]:
                     st.download_button(
-                        label="下載雙語字幕檔",
-                        data=bilingual_subtitle_content,
-                        file_name=f"{st.session_state.input_path.stem}_subtitle_bilingual.srt",
-                        mime="text/plain"
+                        label=f"下載{SUBTITLE_FORMAT_LABELS.get(fmt, fmt)}",
+                        data=subtitle_content,
+                        file_name=Path(path).name,
+                        mime="application/json" if fmt == "json" else "text/plain",
+                        key=f"download_{fmt}"
                     )
+                col_index += 1
+
+def play_from(media_path, start):
+    st.session_state.library_playback = (media_path, start)
+
+def display_library_search(processor):
+    """搜尋所有已處理的逐字稿，並可從命中位置開始播放"""
+    with st.expander("搜尋所有逐字稿"):
+        query = st.text_input("關鍵字", key="library_query")
+        if query:
+            results = processor.search_index.search(query, limit=SEARCH_RESULTS_LIMIT)
+            if not results:
+                st.caption("沒有符合的結果")
+            for i, hit in enumerate(results):
+                timestamp = format_timestamp(hit["start"])[:8]
+                snippet = hit["text"].replace('\n', ' ')
+                col1, col2 = st.columns([5, 1])
+                with col1:
+                    st.markdown(f"**{hit['name']}**　`{timestamp}`")
+                    st.text(snippet[:120] + ("…" if len(snippet) > 120 else ""))
+                with col2:
+                    if hit["media_path"] and Path(hit["media_path"]).exists():
+                        st.button("從此處播放", key=f"play_{i}", on_click=play_from,
+                                  args=(hit["media_path"], hit["start"]))
+
+        playback = st.session_state.get('library_playback')
+        if playback and Path(playback[0]).exists():
+            media_path, start = playback
+            if Path(media_path).suffix.lower() in VIDEO_SUFFIXES:
+                st.video(media_path, start_time=int(start))
+            else:
+                st.audio(media_path, start_time=int(start))
 
 def main():
     st.title("音訊/影片轉文字系統")
@@ -172,16 +377,15 @@ def main():
   
     # 重新開始按鈕
     if st.button("重新開始(先按『重新開始』，再重新上傳檔案，才可以開始另外一個轉換任務!)"):
+        # 只清理此 session 的工作目錄，不影響其他使用者
+        try:
+            st.session_state.workspace.remove()
+            get_processor().search_index.remove_recordings_under(st.session_state.workspace.root)
+        except Exception as e:
+            print(f"清理檔案失敗：{str(e)}")
         # 清理 session state
         for key in list(st.session_state.keys()):
             del st.session_state[key]
-        # 清理檔案
-        for path in [temp_dir, input_dir]:
-            for file in path.glob("*"):
-                try:
-                    os.remove(file)
-                except Exception as e:
-                    print(f"清理檔案失敗：{str(e)}")
         initialize_session_state()
         st.rerun()
 
@@ -192,6 +396,30 @@ def main():
         generate_transcript = st.checkbox("生成逐字稿", value=True)
     with col2:
         generate_subtitles = st.checkbox("生成字幕檔")
+    streaming = st.checkbox("長時間錄音模式（分段辨識並邊處理邊寫入，降低記憶體用量）")
+
+    # 頁面主要元件已繪製，開始背景預熱並顯示模型狀態與啟動時間
+    render_status(get_processor())
+
+    # 啟動背景清理程式，並更新此 session 工作目錄的最後使用時間
+    get_janitor()
+    if st.session_state.workspace.root.exists():
+        st.session_state.workspace.touch()
+
+    # 搜尋所有已處理的逐字稿
+    display_library_search(get_processor())
+
+    subtitle_formats = ["srt", "srt_bilingual"]
+    if generate_subtitles:
+        subtitle_formats = st.multiselect(
+            "字幕輸出格式（一次辨識即可輸出多種格式）",
+            options=list(SUBTITLE_FORMAT_LABELS.keys()),
+            default=subtitle_formats,
+            format_func=lambda fmt: SUBTITLE_FORMAT_LABELS[fmt]
+        )
+        if not subtitle_formats:
+            st.warning("請至少選擇一種字幕輸出格式")
+            return
 
     # 檔案上傳
     uploaded_file = st.file_uploader(
@@ -218,7 +446,7 @@ def main():
             status_text = st.empty()
             
             if process_file(uploaded_file, progress_bar, status_text, 
-                          generate_transcript, generate_subtitles):
+                          generate_transcript, generate_subtitles, subtitle_formats, streaming):
                 st.session_state.processed = True
                 display_results(generate_transcript, generate_subtitles)
         
@@ -0,0 +1,278 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from modules.checkpoint import CheckpointStore
+from modules.processor import AudioVideoProcessor, CHINESE_LANGUAGES, VIDEO_SUFFIXES
+from modules.subtitle_writer import SubtitleWriter
+from modules.translator import convert_to_traditional
+from modules.workspace import JobWorkspace
+
+
+class AsyncAudioVideoProcessor:
+    """AudioVideoProcessor 的非同步管線
+
+    FFmpeg 以 asyncio 子程序執行，Whisper 推論排入專用的執行緒池，
+    翻譯使用非同步 OpenAI client，讓同一個行程可以交錯處理多個工作的 I/O 階段
+    """
+
+    def __init__(self, processor=None, inference_workers=1, max_concurrent_requests=4):
+        self.processor = processor or AudioVideoProcessor()
+        self.translator = self.processor.translator
+        # 模型推論佔用 CPU/GPU，集中在專用執行緒池依序執行
+        self.inference_executor = ThreadPoolExecutor(
+            max_workers=inference_workers, thread_name_prefix="whisper"
+        )
+        self.max_concurrent_requests = max_concurrent_requests
+        self._request_semaphore = None
+        self._semaphore_loop = None
+
+    @property
+    def request_semaphore(self):
+        """限制同時進行的 API 請求數；semaphore 綁定事件迴圈，每次 asyncio.run 重新建立"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._semaphore_loop = loop
+        return self._request_semaphore
+
+    async def _limited(self, coroutine):
+        async with self.request_semaphore:
+            return await coroutine
+
+    async def extract_audio(self, video_path, output_path):
+        """以 asyncio 子程序從影片中提取音訊"""
+        try:
+            command = self.processor.build_extract_command(video_path, output_path)
+            print(f"執行指令: {' '.join(command)}")
+
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await process.communicate()
+
+            if process.returncode != 0:
+                stderr = stderr.decode('utf-8', errors='replace')
+                print(f"FFmpeg 錯誤輸出: {stderr}")
+                raise Exception(f"音訊提取失敗: {stderr}")
+
+            if not Path(output_path).exists():
+                raise FileNotFoundError(f"輸出檔案不存在: {output_path}")
+
+            print(f"音訊提取成功: {output_path}")
+            return output_path
+
+        except Exception as e:
+            raise Exception(f"音訊提取失敗：{str(e)}")
+
+    async def recognize(self, input_path, checkpoint=None, workspace=None):
+        """非同步準備音訊，並在推論執行緒池執行語音辨識"""
+        if checkpoint is not None:
+            cached = checkpoint.load("recognition")
+            if cached:
+                print(f"使用已保存的語音辨識結果：{checkpoint.job_id}")
+                return cached
+
+        audio_path = input_path
+        if input_path.suffix.lower() in VIDEO_SUFFIXES:
+            print("正在從影片提取音訊...")
+            temp_audio = self.processor.temp_dir_for(workspace) / f"{input_path.stem}.wav"
+            audio_path = await self.extract_audio(input_path, temp_audio)
+
+        try:
+            loop = asyncio.get_running_loop()
+            recognition = await loop.run_in_executor(
+                self.inference_executor, self.processor.run_model, audio_path
+            )
+        finally:
+            if audio_path != input_path and Path(audio_path).exists():
+                os.remove(audio_path)
+                print(f"已清理臨時音訊檔案：{audio_path}")
+
+        if checkpoint is not None:
+            checkpoint.save("recognition", recognition)
+        return recognition
+
+    async def _translate_chunk(self, chunk, index, lang, checkpoint):
+        """翻譯單一區塊；合併分段翻譯無法對齊時，改用分段後並行逐段翻譯"""
+        pairs = None
+        if self.processor.combined_translation:
+            pairs = await self._limited(self.translator.asegment_and_translate(chunk, lang))
+
+        if pairs is None:
+            print(f"區塊 {index + 1} 改用分段後逐段翻譯")
+            paragraphs = await asyncio.to_thread(self.processor.format_transcript, chunk)
+            paragraphs = [p.strip() for p in paragraphs.split('\n\n') if p.strip()]
+            pairs = await asyncio.gather(*[
+                self._limited(self.translator.atranslate_to_lang(paragraph, lang))
+                for paragraph in paragraphs
+            ])
+            pairs = list(pairs)
+
+        checkpoint.save_unit("translations", index, pairs)
+        return pairs
+
+    async def transcribe_audio(self, file_path, workspace=None, keep_recognition=False):
+        """transcribe_audio 的非同步版本，各區塊的翻譯並行送出"""
+        checkpoint = recognition = None
+        try:
+            print(f"開始處理檔案：{file_path}")
+            input_path = Path(file_path).resolve()
+            if not input_path.exists():
+                raise FileNotFoundError(f"找不到檔案：{input_path}")
+
+            checkpoint = CheckpointStore(
+                f"{CheckpointStore.job_id_for(input_path)}_transcript", self.processor.checkpoint_dir
+            ).acquire()
+            recognition = self.processor.recognition_checkpoint(input_path).acquire()
+            result = await self.recognize(input_path, recognition, workspace)
+
+            detected_language = result.get("language", "")
+            print(f"偵測到的語言: {detected_language}")
+            original_text = result["text"]
+
+            if detected_language not in CHINESE_LANGUAGES:
+                print(f"檢測到{detected_language}，進行翻譯...")
+                chunks = checkpoint.load("chunks")
+                if chunks is None:
+                    chunks = self.translator.split_into_chunks(original_text)
+                    checkpoint.save("chunks", chunks)
+
+                translations = checkpoint.load_units("translations")
+                results = await asyncio.gather(*[
+                    self._translate_chunk(chunk, index, detected_language, checkpoint)
+                    for index, chunk in enumerate(chunks)
+                    if str(index) not in translations
+                ])
+                pending = iter(results)
+
+                formatted_paragraphs = []
+                for index in range(len(chunks)):
+                    pairs = translations.get(str(index))
+                    if pairs is None:
+                        pairs = next(pending)
+                    for translation_result in pairs:
+                        formatted_paragraphs.append(translation_result['original'])
+                        formatted_paragraphs.append(translation_result['translated'])
+                        formatted_paragraphs.append('')  # 添加空行分隔段落
+
+                formatted_text = '\n'.join(formatted_paragraphs).strip()
+            else:
+                # 中文使用本機 OpenCC 快速路徑，轉換為 CPU 工作，放到執行緒執行
+                formatted_text = await asyncio.to_thread(
+                    self.processor.format_chinese_transcript, result, checkpoint
+                )
+
+            transcript_path = self.processor.save_transcript(input_path, formatted_text, workspace)
+            await asyncio.to_thread(
+                self.processor.index_transcript, input_path, transcript_path, formatted_text, result
+            )
+            checkpoint.clear()
+            if not keep_recognition:
+                recognition.clear()
+            return formatted_text
+
+        except Exception as e:
+            import traceback
+            print(f"錯誤堆疊：\n{traceback.format_exc()}")
+            raise Exception(f"語音辨識失敗：{str(e)}")
+        finally:
+            for store in (checkpoint, recognition):
+                if store is not None:
+                    store.release()
+
+    async def export_subtitles(self, file_path, output_formats=("srt", "srt_bilingual"), workspace=None,
+                               keep_recognition=False):
+        """export_subtitles 的非同步版本，各片段的翻譯並行送出"""
+        checkpoint = recognition = None
+        try:
+            print(f"開始處理檔案：{file_path}")
+            input_path = Path(file_path).resolve()
+
+            checkpoint = CheckpointStore(
+                f"{CheckpointStore.job_id_for(input_path)}_subtitles", self.processor.checkpoint_dir
+            ).acquire()
+            recognition = self.processor.recognition_checkpoint(input_path).acquire()
+            result = await self.recognize(input_path, recognition, workspace)
+
+            detected_language = result.get("language", "")
+            print(f"偵測到的語言: {detected_language}")
+
+            if detected_language not in CHINESE_LANGUAGES:
+                print("非中文字幕，開始翻譯...")
+                translations = checkpoint.load_units("translations")
+
+                async def translate_segment(index, segment):
+                    translated_text = translations.get(str(index))
+                    if translated_text is None:
+                        translated_text = await self._limited(
+                            self.translator.atranslate_to_chinese(segment["text"].strip())
+                        )
+                        checkpoint.save_unit("translations", index, translated_text)
+                    segment["original_text"] = segment["text"].strip()
+                    segment["text"] = translated_text
+
+                await asyncio.gather(*[
+                    translate_segment(index, segment)
+                    for index, segment in enumerate(result["segments"])
+                ])
+            else:
+                # 中文字幕以本機 OpenCC 依片段轉為繁體
+                converted = await asyncio.to_thread(
+                    convert_to_traditional, [segment["text"] for segment in result["segments"]]
+                )
+                for segment, text in zip(result["segments"], converted):
+                    segment["text"] = text
+
+            print(f"生成字幕：{', '.join(output_formats)}")
+            writer = SubtitleWriter(self.processor.output_dir_for(workspace) / "subtitles", input_path.stem, output_formats)
+            paths = await asyncio.to_thread(writer.write_all, result["segments"])
+
+            checkpoint.clear()
+            if not keep_recognition:
+                recognition.clear()
+            return paths
+
+        except Exception as e:
+            import traceback
+            print(f"錯誤堆疊：\n{traceback.format_exc()}")
+            raise Exception(f"字幕生成失敗：{str(e)}")
+        finally:
+            for store in (checkpoint, recognition):
+                if store is not None:
+                    store.release()
+
+    async def process_many(self, file_paths, generate_transcript=True, subtitle_formats=None,
+                           workspace_root=Path("workspace")):
+        """同時處理多個檔案，返回 {檔案路徑: {"workspace", "transcript", "subtitles"} 或例外}
+
+        每個檔案使用 workspace_root 下獨立的 JobWorkspace，不同資料夾的同名檔案不會互相覆蓋
+        """
+        async def process_one(file_path):
+            workspace = JobWorkspace(workspace_root)
+            with workspace.in_use():
+                outputs = {"workspace": str(workspace.root)}
+                if generate_transcript:
+                    outputs["transcript"] = await self.transcribe_audio(
+                        file_path, workspace, keep_recognition=bool(subtitle_formats)
+                    )
+                if subtitle_formats:
+                    outputs["subtitles"] = await self.export_subtitles(file_path, subtitle_formats, workspace)
+                return outputs
+
+        try:
+            results = await asyncio.gather(
+                *[process_one(file_path) for file_path in file_paths],
+                return_exceptions=True
+            )
+        finally:
+            # 非同步 client 的連線綁定目前的事件迴圈，結束前關閉
+            await self.translator.aclose()
+        return dict(zip([str(p) for p in file_paths], results))
+
+    def close(self):
+        """關閉推論執行緒池"""
+        self.inference_executor.shutdown(wait=False)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from modules.workspace import Heartbeat, JobWorkspace, lock_is_alive
+
+CHECKPOINT_ROOT = Path("temp") / "checkpoints"
+
+
+class CheckpointStore:
+    """以工作為單位將中間結果保存到磁碟，讓中斷的工作可以從最後完成的單元繼續"""
+
+    def __init__(self, job_id, root=CHECKPOINT_ROOT):
+        self.job_id = job_id
+        self.job_dir = Path(root) / job_id
+        self._heartbeat = None
+
+    @staticmethod
+    def job_id_for(file_path, sample_size=1 << 20):
+        """根據檔名、大小與頭尾內容產生工作 ID，避免對大型檔案做完整雜湊"""
+        path = Path(file_path)
+        size = path.stat().st_size
+        digest = hashlib.sha1(f"{path.name}:{size}".encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read(sample_size))
+            if size > sample_size:
+                f.seek(max(size - sample_size, sample_size))
+                digest.update(f.read(sample_size))
+        return f"{path.stem}_{digest.hexdigest()[:16]}"
+
+    def _try_lock(self, lock_path):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            # 持有者已中斷時接手，沿用它留下的檢查點
+            return not lock_is_alive(lock_path)
+
+    def acquire(self):
+        """開始處理前取得檢查點；同一檔案已有其他工作在處理時，改用此工作專屬的目錄
+
+        同內容的檔案共用以內容命名的目錄才能中斷後繼續，但兩個工作同時處理時，
+        先完成的工作 clear() 會刪掉另一個工作的進度，因此後到的工作不沿用也不共用
+        """
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        lock_path = self.job_dir / JobWorkspace.LOCK_FILE
+        if not self._try_lock(lock_path):
+            print(f"檢查點 {self.job_id} 正由其他工作使用，改用獨立的檢查點目錄")
+            self.job_dir = self.job_dir.with_name(f"{self.job_id}-{uuid.uuid4().hex[:8]}")
+            self.job_dir.mkdir(parents=True, exist_ok=True)
+            lock_path = self.job_dir / JobWorkspace.LOCK_FILE
+        self._heartbeat = Heartbeat(lock_path).start()
+        return self
+
+    def release(self):
+        """結束處理，保留檢查點供下次繼續；清理程式會依最後使用時間刪除過期的檢查點"""
+        if self._heartbeat is None:
+            return
+        self._heartbeat.stop()
+        self._heartbeat = None
+        if self.job_dir.exists():
+            (self.job_dir / JobWorkspace.STAMP_FILE).touch()
+            lock_path = self.job_dir / JobWorkspace.LOCK_FILE
+            if lock_path.exists():
+                lock_path.unlink()
+
+    def _path(self, name, suffix):
+        return self.job_dir / f"{name}{suffix}"
+
+    def load(self, name):
+        """讀取整份檢查點，不存在或損毀時返回 None"""
+        path = self._path(name, ".json")
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"檢查點讀取失敗，將重新處理：{path}（{str(e)}）")
+            return None
+
+    def save(self, name, data):
+        """以先寫暫存檔再替換的方式保存整份檢查點"""
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, ".json")
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load_units(self, name):
+        """讀取逐單元保存的結果，返回 {key: value}；忽略中斷時寫壞的最後一行"""
+        path = self._path(name, ".jsonl")
+        units = {}
+        if not path.exists():
+            return units
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                units[str(record["key"])] = record["value"]
+        return units
+
+    def save_unit(self, name, key, value):
+        """追加保存單一完成的單元（例如一個段落的翻譯）"""
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, ".jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": str(key), "value": value}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        """工作完成後刪除檢查點"""
+        if self._heartbeat is not None:
+            self._heartbeat.stop()
+            self._heartbeat = None
+        if self.job_dir.exists():
+            shutil.rmtree(self.job_dir, ignore_errors=True)
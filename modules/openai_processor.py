@@ -83,7 +83,8 @@ class OpenAITextProcessor:
             print(f"文本處理失敗：{str(e)}")
             return self.basic_segment(text)
             
-    def basic_segment(self, text):
+    @staticmethod
+    def basic_segment(text):
         """基本的中文文本分段方法,作為備用"""
         # 移除多餘的空白
         text = re.sub(r'\s+', ' ', text).strip()
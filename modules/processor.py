@@ -1,29 +1,127 @@
-import whisper
-import torch
 import os
 from pathlib import Path
-from datetime import timedelta
 import subprocess
-from modules.translator import Translator
-import torch
-from modules.openai_processor import OpenAITextProcessor  # 改為引入 OpenAITextProcessor
+import threading
+from modules.subtitle_writer import SubtitleWriter
+from modules.checkpoint import CheckpointStore, CHECKPOINT_ROOT
+
+# Whisper 可能返回的中文語言代碼
+CHINESE_LANGUAGES = ["zh", "chi", "zho", "zh-TW", "zh-CN"]
+
+# 需要先提取音訊的影片格式
+VIDEO_SUFFIXES = ['.mp4', '.mov', '.avi', '.mkv']
+
+# 視為句子結尾的標點
+SENTENCE_ENDINGS = '。！？!?.…'
+
+# 片段以這些標點結尾時改為句號，而不是在後面再補一個句號
+SOFT_PUNCTUATION = '，、；,;:：'
 
 class AudioVideoProcessor:
     def __init__(self):
         self.model_dir = Path("model")
         self.output_dir = Path("output")
+        self.checkpoint_dir = CHECKPOINT_ROOT
+        self.combined_translation = True  # 以單次 API 呼叫同時分段與翻譯，無法對齊時退回逐段翻譯
         self.setup_directories()
-        self.ffmpeg_path = self.setup_ffmpeg()
-        self.model = self.load_whisper_model()
-        self.translator = Translator()
-        self.text_processor = OpenAITextProcessor()  # 使用 OpenAITextProcessor 替代 LLMTextProcessor
+        # FFmpeg 檢查、Whisper/torch 匯入與模型載入都延後到第一次使用或背景預熱時
+        self._ffmpeg_path = None
+        self._model = None
+        self._translator = None
+        self._text_processor = None
+        self._search_index = None
+        self._init_lock = threading.RLock()
+        # 所有 session 共用同一個模型；Whisper 解碼時會在共用的 decoder 掛上 kv-cache hook，
+        # 同時執行兩個 transcribe 會互相讀到對方的快取，因此推論必須逐一執行
+        self._inference_lock = threading.Lock()
+        self._warm_up_thread = None
+        self.ready = threading.Event()
+        self.warm_up_error = None
+
+    @property
+    def ffmpeg_path(self):
+        with self._init_lock:
+            if self._ffmpeg_path is None:
+                self._ffmpeg_path = self.setup_ffmpeg()
+            return self._ffmpeg_path
+
+    @property
+    def model(self):
+        with self._init_lock:
+            if self._model is None:
+                self._model = self.load_whisper_model()
+            return self._model
+
+    @property
+    def translator(self):
+        with self._init_lock:
+            if self._translator is None:
+                from modules.translator import Translator
+                self._translator = Translator()
+            return self._translator
+
+    @property
+    def text_processor(self):
+        with self._init_lock:
+            if self._text_processor is None:
+                from modules.openai_processor import OpenAITextProcessor
+                self._text_processor = OpenAITextProcessor()  # 使用 OpenAITextProcessor 替代 LLMTextProcessor
+            return self._text_processor
+
+    @property
+    def search_index(self):
+        with self._init_lock:
+            if self._search_index is None:
+                from modules.search_index import TranscriptSearchIndex
+                self._search_index = TranscriptSearchIndex(self.output_dir / "search_index.db")
+            return self._search_index
+
+    def index_transcript(self, input_path, transcript_path, formatted_text, result):
+        """將逐字稿加入全文索引；索引失敗不影響逐字稿輸出"""
+        try:
+            segments = result.get("segments", [])
+            if result.get("language") in CHINESE_LANGUAGES:
+                # 片段與逐字稿同樣以繁體建立索引，繁體查詢才找得到片段的時間點
+                from modules.translator import convert_to_traditional
+                segments = [
+                    dict(segment, text=text)
+                    for segment, text in zip(segments, convert_to_traditional(s["text"] for s in segments))
+                ]
+            self.search_index.index_transcript(
+                Path(input_path).name, transcript_path, formatted_text, segments,
+                media_path=input_path, language=result.get("language")
+            )
+            print(f"已更新搜尋索引：{transcript_path}")
+        except Exception as e:
+            print(f"更新搜尋索引失敗：{str(e)}")
+
+    def warm_up(self):
+        """檢查 FFmpeg 並載入模型，完成後設定 ready"""
+        try:
+            self.ffmpeg_path
+            self.model
+            self.ready.set()
+        except Exception as e:
+            self.warm_up_error = e
+            print(f"預熱失敗：{str(e)}")
+
+    def warm_up_in_background(self):
+        """在背景執行緒預熱，重複呼叫只會啟動一次"""
+        with self._init_lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(
+                    target=self.warm_up, name="processor-warm-up", daemon=True
+                )
+                self._warm_up_thread.start()
+        return self._warm_up_thread
 
     def setup_directories(self):
         """設置必要的目錄"""
         for dir_path in [self.model_dir, self.output_dir, 
                         self.output_dir / "transcripts", 
                         self.output_dir / "subtitles", 
-                        Path("temp")]:
+                        Path("temp"),
+                        self.checkpoint_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
 
     def setup_ffmpeg(self):
@@ -54,6 +152,8 @@ class AudioVideoProcessor:
     def load_whisper_model(self):
         """載入 Whisper 模型"""
         try:
+            import torch
+            import whisper
             device = "cuda" if torch.cuda.is_available() else "cpu"
             print(f"使用設備: {device}")
             model = whisper.load_model("base", 
@@ -64,23 +164,27 @@ class AudioVideoProcessor:
         except Exception as e:
             raise Exception(f"模型載入失敗：{str(e)}")
 
+    def build_extract_command(self, video_path, output_path):
+        """組合從影片提取 16kHz 單聲道音訊的 FFmpeg 指令"""
+        # 將路徑轉換為原始字串格式，避免編碼問題
+        video_path_str = str(Path(video_path).resolve())
+        output_path_str = str(Path(output_path).resolve())
+
+        return [
+        self.ffmpeg_path,
+        "-i", video_path_str,
+        "-vn",  # 不處理視訊
+        "-acodec", "pcm_s16le",
+        "-ar", "16000",
+        "-ac", "1",
+        "-y",
+        output_path_str
+        ]
+
     def extract_audio(self, video_path, output_path):
         """從影片中提取音訊"""
         try:
-            # 將路徑轉換為原始字串格式，避免編碼問題
-            video_path_str = str(Path(video_path).resolve())
-            output_path_str = str(Path(output_path).resolve())
-
-            command = [
-            self.ffmpeg_path,
-            "-i", video_path_str,
-            "-vn",  # 不處理視訊
-            "-acodec", "pcm_s16le",
-            "-ar", "16000",
-            "-ac", "1",
-            "-y",
-            output_path_str
-            ]
+            command = self.build_extract_command(video_path, output_path)
         
             print(f"執行指令: {' '.join(command)}")
             
@@ -109,38 +213,93 @@ class AudioVideoProcessor:
         except Exception as e:
             raise Exception(f"音訊提取失敗：{str(e)}")
 
-    def transcribe_audio(self, file_path):
-        """執行語音辨識並格式化文本"""
-        try:
-            print(f"開始處理檔案：{file_path}")
-            input_path = Path(file_path).resolve()
-            print(f"絕對路徑：{input_path}")
-
-            if not input_path.exists():
-                raise FileNotFoundError(f"找不到檔案：{input_path}")
-
-            # 準備音訊檔案
-            audio_path = input_path
-            if input_path.suffix.lower() in ['.mp4', '.mov', '.avi', '.mkv']:
-                print("正在從影片提取音訊...")
-                temp_audio = Path("temp") / f"{input_path.stem}.wav"
-                audio_path = self.extract_audio(input_path, temp_audio)
-
-            print(f"開始語音辨識：{audio_path}")
-            result = self.model.transcribe(
-                str(audio_path),
+    def run_model(self, audio, language=None):
+        """以 Whisper 辨識音訊檔或音訊陣列，只返回後續需要的欄位"""
+        import torch
+        if isinstance(audio, (str, Path)):
+            print(f"開始語音辨識：{audio}")
+            audio = str(audio)
+        model = self.model
+        with self._inference_lock:
+            result = model.transcribe(
+                audio,
                 fp16=torch.cuda.is_available(),
-                language=None,
+                language=language,
                 task='transcribe'
             )
 
+        if not result or "text" not in result:
+            raise Exception("語音辨識結果為空")
+
+        # 只保留後續需要的欄位，避免檢查點過大
+        return {
+            "text": result["text"],
+            "language": result.get("language", ""),
+            "segments": [
+                {"start": s["start"], "end": s["end"], "text": s["text"]}
+                for s in result.get("segments", [])
+            ],
+        }
+
+    def temp_dir_for(self, workspace=None):
+        """暫存目錄；指定工作目錄時使用該工作的獨立目錄"""
+        return workspace.temp_dir if workspace is not None else Path("temp")
+
+    def output_dir_for(self, workspace=None):
+        """輸出目錄；指定工作目錄時使用該工作的獨立目錄"""
+        return workspace.output_dir if workspace is not None else self.output_dir
+
+    def recognition_checkpoint(self, input_path):
+        """語音辨識結果的檢查點；逐字稿與字幕共用，同一檔案只需辨識一次"""
+        return CheckpointStore(f"{CheckpointStore.job_id_for(input_path)}_recognition", self.checkpoint_dir)
+
+    def recognize(self, input_path, checkpoint=None, workspace=None):
+        """準備音訊並執行語音辨識；有檢查點時直接沿用先前的辨識結果"""
+        if checkpoint is not None:
+            cached = checkpoint.load("recognition")
+            if cached:
+                print(f"使用已保存的語音辨識結果：{checkpoint.job_id}")
+                return cached
+
+        # 準備音訊檔案
+        audio_path = input_path
+        if input_path.suffix.lower() in VIDEO_SUFFIXES:
+            print("正在從影片提取音訊...")
+            temp_audio = self.temp_dir_for(workspace) / f"{input_path.stem}.wav"
+            audio_path = self.extract_audio(input_path, temp_audio)
+
+        try:
+            recognition = self.run_model(audio_path)
+        finally:
             # 清理臨時音訊檔案
             if audio_path != input_path and Path(audio_path).exists():
                 os.remove(audio_path)
                 print(f"已清理臨時音訊檔案：{audio_path}")
 
-            if not result or "text" not in result:
-                raise Exception("語音辨識結果為空")
+        if checkpoint is not None:
+            checkpoint.save("recognition", recognition)
+        return recognition
+
+    def transcribe_audio(self, file_path, workspace=None, keep_recognition=False):
+        """執行語音辨識並格式化文本；workspace 為 JobWorkspace 時輸出寫入該工作的獨立目錄
+
+        keep_recognition 為 True 時保留辨識結果的檢查點，接著呼叫 export_subtitles 不需重新辨識
+        """
+        checkpoint = recognition = None
+        try:
+            print(f"開始處理檔案：{file_path}")
+            input_path = Path(file_path).resolve()
+            print(f"絕對路徑：{input_path}")
+
+            if not input_path.exists():
+                raise FileNotFoundError(f"找不到檔案：{input_path}")
+
+            # 以檔案內容建立檢查點，中斷後重新執行可從最後完成的單元繼續
+            checkpoint = CheckpointStore(
+                f"{CheckpointStore.job_id_for(input_path)}_transcript", self.checkpoint_dir
+            ).acquire()
+            recognition = self.recognition_checkpoint(input_path).acquire()
+            result = self.recognize(input_path, recognition, workspace)
 
             # 檢查語言
             detected_language = result.get("language", "")
@@ -149,44 +308,53 @@ class AudioVideoProcessor:
             original_text = result["text"]
             formatted_text = ""
 
-            if detected_language not in ["zh", "chi", "zho", "zh-TW", "zh-CN"]:
+            if detected_language not in CHINESE_LANGUAGES:
                 print(f"檢測到{detected_language}，進行翻譯...")
                 # 使用 translator 進行翻譯
-                from modules.translator import Translator
-                translator = Translator()
+                translator = self.translator
                 
-                # 分段處理文本
-                original_paragraphs = self.format_transcript(original_text).split('\n\n')
+                # 依 token 數切成區塊，每個區塊以一次 API 呼叫完成分段與翻譯
+                chunks = checkpoint.load("chunks")
+                if chunks is None:
+                    chunks = translator.split_into_chunks(original_text)
+                    checkpoint.save("chunks", chunks)
+
+                translations = checkpoint.load_units("translations")
+                if translations:
+                    print(f"從檢查點繼續，已完成 {len(translations)}/{len(chunks)} 個區塊的翻譯")
                 formatted_paragraphs = []
                 
-                for paragraph in original_paragraphs:
-                    if paragraph.strip():
-                        # 翻譯每個段落
-                        translation_result = translator.translate_to_lang(paragraph.strip(),detected_language)
+                for index, chunk in enumerate(chunks):
+                    pairs = translations.get(str(index))
+                    if pairs is None:
+                        if self.combined_translation:
+                            pairs = translator.segment_and_translate(chunk, detected_language)
+                        if pairs is None:
+                            pairs = self._translate_chunk_by_paragraph(
+                                translator, chunk, index, detected_language, checkpoint
+                            )
+                        # 區塊完成後立即保存
+                        checkpoint.save_unit("translations", index, pairs)
+
+                    for translation_result in pairs:
                         formatted_paragraphs.append(translation_result['original'])
                         formatted_paragraphs.append(translation_result['translated'])
                         formatted_paragraphs.append('')  # 添加空行分隔段落
                 
                 formatted_text = '\n'.join(formatted_paragraphs).strip()
             else:
-                # 使用 translator 進行翻譯
-                from modules.translator import Translator
-                translator = Translator()
-                # 中文則使用原本的格式化方式
-                translated_text = translator.translate_to_chinese(original_text)
-                formatted_text = self.format_transcript(translated_text)
+                # 中文使用本機 OpenCC 轉換與基本分段，不需要呼叫 API
+                formatted_text = self.format_chinese_transcript(result, checkpoint)
             
 
             # 保存逐字稿到 output/transcripts 目錄
-            transcript_filename = f"{input_path.stem}_transcript.txt"
-            transcript_path = self.output_dir / "transcripts" / transcript_filename
-            
-            try:
-                with open(transcript_path, "w", encoding="utf-8") as f:
-                    f.write(formatted_text)
-                print(f"逐字稿已保存到：{transcript_path}")
-            except Exception as e:
-                print(f"保存逐字稿時發生錯誤：{str(e)}")
+            transcript_path = self.save_transcript(input_path, formatted_text, workspace)
+            self.index_transcript(input_path, transcript_path, formatted_text, result)
+
+            # 工作完成，清除檢查點
+            checkpoint.clear()
+            if not keep_recognition:
+                recognition.clear()
             
             return formatted_text
 
@@ -194,107 +362,164 @@ class AudioVideoProcessor:
             import traceback
             print(f"錯誤堆疊：\n{traceback.format_exc()}")
             raise Exception(f"語音辨識失敗：{str(e)}")
+        finally:
+            for store in (checkpoint, recognition):
+                if store is not None:
+                    store.release()
             
-    def generate_subtitles(self, file_path, output_format="srt"):
-        """生成字幕檔"""
+    def format_chinese_transcript(self, result, checkpoint):
+        """中文逐字稿的快速路徑：依片段以本機 OpenCC 轉為繁體並做基本分段
+
+        只有在轉換結果確認含有大量非中文文字時，才改用 OpenAI 翻譯與語意分段
+        """
+        formatted_text = checkpoint.load("segmentation")
+        if formatted_text is not None:
+            return formatted_text
+
+        texts = [segment["text"].strip() for segment in result.get("segments", [])] or [result["text"]]
+        formatted_text = self.format_chinese_segments(texts)
+        checkpoint.save("segmentation", formatted_text)
+        return formatted_text
+
+    @staticmethod
+    def _end_sentence(text):
+        """以句號結束片段；結尾的逗號、頓號等改為句號，不會產生「，。」"""
+        text = text.strip()
+        if not text or text[-1] in SENTENCE_ENDINGS:
+            return text
+        text = text.rstrip(SOFT_PUNCTUATION).rstrip()
+        return text + '。' if text else ''
+
+    def format_chinese_segments(self, texts):
+        """將中文片段轉為繁體並分段；確認含有大量非中文文字時才呼叫 OpenAI"""
+        from modules.translator import convert_to_traditional, contains_non_chinese
+
+        # Whisper 的中文片段常沒有標點，以片段邊界作為句子邊界，基本分段才能切出段落
+        translated_text = ''.join(self._end_sentence(text) for text in convert_to_traditional(texts))
+
+        if contains_non_chinese(translated_text):
+            print("轉換結果含有非中文文字，改用 OpenAI 翻譯")
+            translated_text = self.translator.translate_to_chinese(translated_text)
+            return self.format_transcript(translated_text)
+
+        print("使用 OpenCC 轉換為繁體中文")
+        return self._basic_format_transcript(translated_text)
+
+    def save_transcript(self, input_path, formatted_text, workspace=None):
+        """保存逐字稿到 output/transcripts 目錄"""
+        transcript_filename = f"{Path(input_path).stem}_transcript.txt"
+        transcript_path = self.output_dir_for(workspace) / "transcripts" / transcript_filename
+        
+        try:
+            with open(transcript_path, "w", encoding="utf-8") as f:
+                f.write(formatted_text)
+            print(f"逐字稿已保存到：{transcript_path}")
+        except Exception as e:
+            print(f"保存逐字稿時發生錯誤：{str(e)}")
+        return transcript_path
+
+    def _translate_chunk_by_paragraph(self, translator, chunk, chunk_index, lang, checkpoint):
+        """先分段再逐段翻譯，作為合併分段翻譯無法對齊時的備用方案"""
+        print(f"區塊 {chunk_index + 1} 改用分段後逐段翻譯")
+        segmentation = checkpoint.load_units("segmentation")
+        paragraphs = segmentation.get(str(chunk_index))
+        if paragraphs is None:
+            paragraphs = [p.strip() for p in self.format_transcript(chunk).split('\n\n') if p.strip()]
+            checkpoint.save_unit("segmentation", chunk_index, paragraphs)
+
+        done = checkpoint.load_units("paragraphs")
+        pairs = []
+        for index, paragraph in enumerate(paragraphs):
+            key = f"{chunk_index}-{index}"
+            translation_result = done.get(key)
+            if translation_result is None:
+                translation_result = translator.translate_to_lang(paragraph, lang)
+                checkpoint.save_unit("paragraphs", key, translation_result)
+            pairs.append(translation_result)
+        return pairs
+
+    def process_streaming(self, file_path, output_formats=("srt", "srt_bilingual"), generate_transcript=True,
+                          workspace=None, window_seconds=600):
+        """長時間錄音的串流模式：逐窗辨識並邊處理邊寫入，記憶體用量不隨錄音長度增加"""
+        from modules.streaming import StreamingTranscriber
+        return StreamingTranscriber(self, window_seconds).run(
+            file_path, output_formats, generate_transcript, workspace
+        )
+
+    def generate_subtitles(self, file_path, output_format="srt", workspace=None):
+        """生成字幕檔，返回 (單語字幕路徑, 雙語字幕路徑或 None)"""
+        paths = self.export_subtitles(file_path, [output_format, f"{output_format}_bilingual"], workspace)
+        return paths[output_format], paths.get(f"{output_format}_bilingual")
+
+    def export_subtitles(self, file_path, output_formats=("srt", "srt_bilingual"), workspace=None,
+                         keep_recognition=False):
+        """執行一次語音辨識，並在單次走訪中輸出所有指定格式
+
+        支援格式：srt、vtt、srt_bilingual、vtt_bilingual、json、txt
+        返回 {格式: 檔案路徑}，沒有原文時不會輸出雙語字幕
+        """
+        checkpoint = recognition = None
         try:
             print(f"開始處理檔案：{file_path}")
             input_path = Path(file_path).resolve()
 
-            # 準備音訊檔案
-            audio_path = input_path
-            if input_path.suffix.lower() in ['.mp4', '.mov', '.avi', '.mkv']:
-                print("正在從影片提取音訊...")
-                temp_audio = Path("temp") / f"{input_path.stem}.wav"
-                audio_path = self.extract_audio(input_path, temp_audio)
-
+            checkpoint = CheckpointStore(
+                f"{CheckpointStore.job_id_for(input_path)}_subtitles", self.checkpoint_dir
+            ).acquire()
             print("執行語音辨識...")
-            result = self.model.transcribe(
-                str(audio_path),
-                fp16=torch.cuda.is_available(),
-                language=None,
-                task='transcribe'
-            )
+            recognition = self.recognition_checkpoint(input_path).acquire()
+            result = self.recognize(input_path, recognition, workspace)
 
             # 檢查偵測到的語言
             detected_language = result.get("language", "")
             print(f"偵測到的語言: {detected_language}")
 
             # 如果不是中文，就翻譯
-            if detected_language not in ["zh", "chi", "zho", "zh-TW", "zh-CN"]:
+            if detected_language not in CHINESE_LANGUAGES:
                 print("非中文字幕，開始翻譯...")
-                from modules.translator import Translator
-                translator = Translator()
+                translator = self.translator
+
+                translations = checkpoint.load_units("translations")
+                if translations:
+                    print(f"從檢查點繼續，已完成 {len(translations)} 個片段的翻譯")
                 
-                # 翻譯每個段落
-                for segment in result["segments"]:
+                # 翻譯每個段落，完成後立即保存
+                for index, segment in enumerate(result["segments"]):
                     original_text = segment["text"].strip()
-                    translated_text = translator.translate_to_chinese(original_text)
+                    translated_text = translations.get(str(index))
+                    if translated_text is None:
+                        translated_text = translator.translate_to_chinese(original_text)
+                        checkpoint.save_unit("translations", index, translated_text)
                     segment["text"] = translated_text
                     # 保存原文到新的鍵
                     segment["original_text"] = original_text
+            else:
+                # 中文字幕以本機 OpenCC 依片段轉為繁體
+                from modules.translator import convert_to_traditional
+                converted = convert_to_traditional(segment["text"] for segment in result["segments"])
+                for segment, text in zip(result["segments"], converted):
+                    segment["text"] = text
 
-            # 生成字幕檔
-            subtitle_path = self.output_dir / "subtitles" / f"{input_path.stem}.{output_format}"
-            bilingual_subtitle_path = self.output_dir / "subtitles" / f"{input_path.stem}_bilingual.{output_format}"
-            
-            # 生成單語字幕（只有中文）
-            print("生成中文字幕...")
-            with open(subtitle_path, "w", encoding="utf-8") as f:
-                if output_format == "vtt":
-                    f.write("WEBVTT\n\n")
-                    
-                for i, segment in enumerate(result["segments"], start=1):
-                    start = str(timedelta(seconds=int(segment["start"])))
-                    end = str(timedelta(seconds=int(segment["end"])))
-                    text = segment["text"].strip()
-                    
-                    if output_format == "srt":
-                        f.write(f"{i}\n")
-                        f.write(f"{start} --> {end}\n")
-                        f.write(f"{text}\n\n")
-                    else:  # vtt
-                        f.write(f"{start} --> {end}\n")
-                        f.write(f"{text}\n\n")
-
-            # 如果有原文，生成雙語字幕
-            if any("original_text" in segment for segment in result["segments"]):
-                print("生成雙語字幕...")
-                with open(bilingual_subtitle_path, "w", encoding="utf-8") as f:
-                    if output_format == "vtt":
-                        f.write("WEBVTT\n\n")
-                    
-                    for i, segment in enumerate(result["segments"], start=1):
-                        start = str(timedelta(seconds=int(segment["start"])))
-                        end = str(timedelta(seconds=int(segment["end"])))
-                        text = segment["text"].strip()
-                        original = segment.get("original_text", "").strip()
-                        
-                        if output_format == "srt":
-                            f.write(f"{i}\n")
-                            f.write(f"{start} --> {end}\n")
-                            if original:
-                                f.write(f"{original}\n{text}\n\n")
-                            else:
-                                f.write(f"{text}\n\n")
-                        else:  # vtt
-                            f.write(f"{start} --> {end}\n")
-                            if original:
-                                f.write(f"{original}\n{text}\n\n")
-                            else:
-                                f.write(f"{text}\n\n")
+            # 單次走訪片段，同時寫出所有格式
+            print(f"生成字幕：{', '.join(output_formats)}")
+            writer = SubtitleWriter(self.output_dir_for(workspace) / "subtitles", input_path.stem, output_formats)
+            paths = writer.write_all(result["segments"])
 
-            # 清理臨時音訊檔案
-            if audio_path != input_path and Path(audio_path).exists():
-                os.remove(audio_path)
-                print(f"已清理臨時音訊檔案：{audio_path}")
+            # 工作完成，清除檢查點
+            checkpoint.clear()
+            if not keep_recognition:
+                recognition.clear()
 
-            return str(subtitle_path), str(bilingual_subtitle_path) if Path(bilingual_subtitle_path).exists() else None
+            return paths
 
         except Exception as e:
             import traceback
             print(f"錯誤堆疊：\n{traceback.format_exc()}")
             raise Exception(f"字幕生成失敗：{str(e)}")
+        finally:
+            for store in (checkpoint, recognition):
+                if store is not None:
+                    store.release()
 
     def download_ffmpeg(self):
         """下載並解壓 FFmpeg"""
@@ -354,4 +579,9 @@ class AudioVideoProcessor:
         except Exception as e:
             print(f"OpenAI API 處理失敗，使用基本格式化：{str(e)}")
             # 如果 API 處理失敗，使用原有的格式化方法
-            return self._basic_format_transcript(text)            
+            return self._basic_format_transcript(text)
+
+    def _basic_format_transcript(self, text):
+        """不呼叫 API 的基本分段"""
+        from modules.openai_processor import OpenAITextProcessor
+        return OpenAITextProcessor.basic_segment(text)            
@@ -0,0 +1,328 @@
+import os
+import re
+import sqlite3
+import time
+from bisect import bisect_left
+from contextlib import closing
+from pathlib import Path
+
+from modules.transcript_index import cjk_bigrams, split_paragraphs
+
+_CJK_CHAR = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+
+
+def index_tokens(text):
+    """索引用詞元：二元組加上單一中日韓字元，讓單字查詢也能命中"""
+    tokens = cjk_bigrams(text)
+    tokens.extend(set(_CJK_CHAR.findall(text)))
+    return ' '.join(tokens)
+
+
+def align_paragraphs(paragraphs, segments):
+    """依文字長度比例估計每個段落在媒體中的起訖時間
+
+    段落經過分段、翻譯或繁簡轉換後無法逐字對應到辨識片段，
+    因此以段落在全文中的相對位置，對應到相同相對位置的片段時間
+    """
+    if not segments:
+        return [(0.0, 0.0) for _ in paragraphs]
+
+    segment_lengths = [len(re.sub(r'\s+', '', s["text"])) or 1 for s in segments]
+    segment_total = sum(segment_lengths)
+    paragraph_lengths = [len(re.sub(r'\s+', '', p)) or 1 for p in paragraphs]
+    paragraph_total = sum(paragraph_lengths) or 1
+
+    # 每個片段結束時的累計比例
+    boundaries = []
+    cumulative = 0
+    for length in segment_lengths:
+        cumulative += length
+        boundaries.append(cumulative / segment_total)
+
+    def segment_at(ratio):
+        for index, boundary in enumerate(boundaries):
+            if ratio < boundary:
+                return segments[index]
+        return segments[-1]
+
+    spans = []
+    cumulative = 0
+    for length in paragraph_lengths:
+        start_ratio = cumulative / paragraph_total
+        cumulative += length
+        end_ratio = min(cumulative / paragraph_total, 1.0) - 1e-9
+        spans.append((segment_at(start_ratio)["start"], segment_at(end_ratio)["end"]))
+    return spans
+
+
+class TranscriptSearchIndex:
+    """以 SQLite FTS5 建立的逐字稿全文索引，可將搜尋結果對應到媒體時間"""
+
+    def __init__(self, db_path=Path("output") / "search_index.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS recordings (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    media_path TEXT,
+                    transcript_path TEXT NOT NULL UNIQUE,
+                    language TEXT,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    recording_id INTEGER NOT NULL REFERENCES recordings(id) ON DELETE CASCADE,
+                    kind TEXT NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    text TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_recording ON entries(recording_id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                    tokens, tokenize = 'unicode61 remove_diacritics 0'
+                );
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def add_recording(self, name, transcript_path, entries, media_path=None, language=None):
+        """新增或更新一份逐字稿的索引；entries 為 [{"kind", "start", "end", "text"}, ...]"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT id FROM recordings WHERE transcript_path = ?", (str(transcript_path),)
+            ).fetchone()
+            if row:
+                # 重新處理同一份逐字稿時，先移除舊的索引內容
+                self._delete_recording(conn, row[0])
+
+            recording_id = conn.execute(
+                "INSERT INTO recordings (name, media_path, transcript_path, language, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (name, str(media_path) if media_path else None, str(transcript_path), language, time.time())
+            ).lastrowid
+            self._insert_entries(conn, recording_id, entries)
+        return recording_id
+
+    @staticmethod
+    def _delete_recording(conn, recording_id):
+        # FTS 虛擬表不會隨外鍵連動刪除，需先刪除對應的詞元
+        conn.execute(
+            "DELETE FROM entries_fts WHERE rowid IN (SELECT id FROM entries WHERE recording_id = ?)",
+            (recording_id,)
+        )
+        conn.execute("DELETE FROM recordings WHERE id = ?", (recording_id,))
+
+    def remove_recordings_under(self, directory):
+        """移除逐字稿位於指定目錄下的所有索引，供刪除工作目錄時呼叫；返回移除的逐字稿數"""
+        directory = Path(directory)
+        prefixes = {str(directory), str(directory.resolve())}
+        with closing(self._connect()) as conn, conn:
+            recording_ids = set()
+            for prefix in prefixes:
+                prefix = prefix.rstrip("/\\") + os.sep
+                recording_ids.update(row[0] for row in conn.execute(
+                    "SELECT id FROM recordings WHERE substr(transcript_path, 1, ?) = ?",
+                    (len(prefix), prefix)
+                ))
+            for recording_id in recording_ids:
+                self._delete_recording(conn, recording_id)
+        return len(recording_ids)
+
+    def resume_recording(self, transcript_path, start, previous_path=None):
+        """串流處理中斷後接續既有的索引，返回逐字稿 ID；找不到時返回 None
+
+        移除 start 秒之後（中斷時可能只寫入一部分）的索引內容；
+        接續的逐字稿換了位置時，一併將索引改到新的路徑
+        """
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT id FROM recordings WHERE transcript_path = ?", (str(previous_path or transcript_path),)
+            ).fetchone()
+            if row is None:
+                return None
+            recording_id = row[0]
+            conn.execute(
+                "DELETE FROM entries_fts WHERE rowid IN "
+                "(SELECT id FROM entries WHERE recording_id = ? AND start >= ?)",
+                (recording_id, start)
+            )
+            conn.execute("DELETE FROM entries WHERE recording_id = ? AND start >= ?", (recording_id, start))
+
+            if previous_path is not None and str(previous_path) != str(transcript_path):
+                row = conn.execute(
+                    "SELECT id FROM recordings WHERE transcript_path = ?", (str(transcript_path),)
+                ).fetchone()
+                if row:
+                    self._delete_recording(conn, row[0])
+                conn.execute(
+                    "UPDATE recordings SET transcript_path = ?, indexed_at = ? WHERE id = ?",
+                    (str(transcript_path), time.time(), recording_id)
+                )
+        return recording_id
+
+    def add_entries(self, recording_id, entries):
+        """追加索引內容到既有的逐字稿，供串流處理逐段寫入"""
+        with closing(self._connect()) as conn, conn:
+            self._insert_entries(conn, recording_id, entries)
+
+    def _insert_entries(self, conn, recording_id, entries):
+        for entry in entries:
+            text = entry["text"].strip()
+            if not text:
+                continue
+            entry_id = conn.execute(
+                "INSERT INTO entries (recording_id, kind, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                (recording_id, entry["kind"], entry["start"], entry["end"], text)
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO entries_fts (rowid, tokens) VALUES (?, ?)",
+                (entry_id, index_tokens(text))
+            )
+
+    @staticmethod
+    def transcript_entries(formatted_text, segments):
+        """以辨識片段（精確時間）與逐字稿段落（估計時間）組成索引內容"""
+        entries = [
+            {"kind": "segment", "start": s["start"], "end": s["end"], "text": s["text"]}
+            for s in segments
+        ]
+        paragraphs = split_paragraphs(formatted_text)
+        # 雙語段落的第一行是原文，以原文長度對齊辨識片段
+        spans = align_paragraphs([p.split('\n')[0] for p in paragraphs], segments)
+        for paragraph, (start, end) in zip(paragraphs, spans):
+            entries.append({"kind": "paragraph", "start": start, "end": end, "text": paragraph})
+        return entries
+
+    def index_transcript(self, name, transcript_path, formatted_text, segments,
+                         media_path=None, language=None):
+        """建立整份逐字稿的索引"""
+        entries = self.transcript_entries(formatted_text, segments)
+        return self.add_recording(name, transcript_path, entries, media_path, language)
+
+    @staticmethod
+    def _match_expression(needle):
+        """將查詢字串轉為 FTS5 查詢式；沒有可查詢的詞元時返回 None"""
+        tokens = cjk_bigrams(needle)
+        if not tokens:
+            return None
+
+        # 非中日韓詞元可能只是單字的一部分，使用前綴查詢
+        terms = []
+        for token in tokens:
+            quoted = '"' + token.replace('"', '""') + '"'
+            terms.append(quoted if _CJK_CHAR.match(token) else quoted + '*')
+        return ' AND '.join(terms)
+
+    def search(self, query, limit=50):
+        """搜尋所有逐字稿，返回依相關度排序的命中結果與對應的媒體時間"""
+        needle = query.strip().lower()
+        match = self._match_expression(needle)
+        if match is None:
+            return []
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """
+                SELECT r.name, r.media_path, r.transcript_path, e.kind, e.start, e.end, e.text
+                FROM entries_fts
+                JOIN entries e ON e.id = entries_fts.rowid
+                JOIN recordings r ON r.id = e.recording_id
+                WHERE entries_fts MATCH ?
+                ORDER BY bm25(entries_fts)
+                LIMIT ?
+                """,
+                (match, limit * 4)
+            ).fetchall()
+
+        results = []
+        for name, media_path, transcript_path, kind, start, end, text in rows:
+            # 以原文比對排除詞元順序不同的誤判
+            if needle not in text.lower():
+                continue
+            results.append({
+                "name": name,
+                "media_path": media_path,
+                "transcript_path": transcript_path,
+                "kind": kind,
+                "start": start,
+                "end": end,
+                "text": text,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    @staticmethod
+    def _paragraph_rows(conn, recording_id):
+        # 段落依寫入順序保存，以 id 排序即為逐字稿中的段落順序
+        return conn.execute(
+            "SELECT id, start, end, text FROM entries WHERE recording_id = ? AND kind = 'paragraph' ORDER BY id",
+            (recording_id,)
+        ).fetchall()
+
+    def find_paragraphs(self, transcript_path, query):
+        """返回指定逐字稿中包含查詢字串的段落序號（依出現順序）
+
+        逐字稿沒有索引，或查詢沒有可查詢的詞元（例如只有標點）時返回 None，由呼叫端自行比對
+        """
+        needle = query.strip().lower()
+        match = self._match_expression(needle)
+        if match is None:
+            return None
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id FROM recordings WHERE transcript_path = ?", (str(transcript_path),)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute(
+                """
+                SELECT e.id, e.text
+                FROM entries_fts
+                JOIN entries e ON e.id = entries_fts.rowid
+                WHERE entries_fts MATCH ? AND e.recording_id = ? AND e.kind = 'paragraph'
+                """,
+                (match, row[0])
+            ).fetchall()
+            # 以原文比對排除詞元順序不同的誤判
+            matched = sorted(entry_id for entry_id, text in rows if needle in text.lower())
+            if not matched:
+                return []
+            paragraph_ids = [entry_id for entry_id, _, _, _ in self._paragraph_rows(conn, row[0])]
+        return [bisect_left(paragraph_ids, entry_id) for entry_id in matched]
+
+    def replace_paragraphs(self, transcript_path, start, end, paragraphs):
+        """逐字稿第 start 到 end（不含）個段落被編輯後更新索引；新段落沿用被取代段落的時間範圍"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT id FROM recordings WHERE transcript_path = ?", (str(transcript_path),)
+            ).fetchone()
+            if row is None:
+                return
+            recording_id = row[0]
+            rows = self._paragraph_rows(conn, recording_id)
+            replaced = rows[start:end]
+            if replaced:
+                span = (replaced[0][1], replaced[-1][2])
+            elif start > 0 and rows:
+                span = (rows[min(start, len(rows)) - 1][2],) * 2
+            else:
+                span = (0.0, 0.0)
+
+            # 之後的段落一併刪除再依序寫入，維持 id 與段落順序一致
+            tail_ids = [(entry_id,) for entry_id, _, _, _ in rows[start:]]
+            conn.executemany("DELETE FROM entries_fts WHERE rowid = ?", tail_ids)
+            conn.executemany("DELETE FROM entries WHERE id = ?", tail_ids)
+            entries = [{"kind": "paragraph", "start": span[0], "end": span[1], "text": p} for p in paragraphs]
+            entries.extend(
+                {"kind": "paragraph", "start": entry_start, "end": entry_end, "text": text}
+                for _, entry_start, entry_end, text in rows[end:]
+            )
+            self._insert_entries(conn, recording_id, entries)
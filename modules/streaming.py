@@ -0,0 +1,304 @@
+import os
+import wave
+from pathlib import Path
+
+from modules.checkpoint import CheckpointStore
+from modules.processor import CHINESE_LANGUAGES
+from modules.subtitle_writer import SubtitleWriter
+
+# extract_audio 輸出的音訊格式：16kHz、單聲道、16-bit PCM
+SAMPLE_RATE = 16000
+
+
+class Segment:
+    """精簡的辨識片段，以 __slots__ 保存，避免每個片段都帶一個 dict"""
+
+    __slots__ = ("start", "end", "text", "original_text")
+
+    def __init__(self, start, end, text, original_text=None):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.original_text = original_text
+
+    # 讓 SubtitleWriter 與搜尋索引可以像 dict 一樣讀取欄位
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+
+def iter_audio_windows(wav_path, window_seconds=600, start_window=0):
+    """逐窗讀取 16kHz 單聲道 WAV，產生 (起始秒數, float32 音訊陣列)；start_window 之前的時間窗直接跳過"""
+    import numpy as np
+
+    with wave.open(str(wav_path), "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise Exception("串流模式需要 16kHz 單聲道 16-bit WAV")
+        frames_per_window = int(window_seconds * SAMPLE_RATE)
+        offset = start_window * frames_per_window
+        if offset >= wav.getnframes():
+            return
+        wav.setpos(offset)
+        while True:
+            frames = wav.readframes(frames_per_window)
+            if not frames:
+                break
+            audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32)
+            audio /= 32768.0  # 原地縮放，避免再配置一份視窗大小的陣列
+            yield offset / SAMPLE_RATE, audio
+            offset += len(audio)
+
+
+def _copy_head(src_path, dst_path, size, block_size=1 << 16):
+    """複製檔案開頭 size 個位元組到新的位置"""
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        while size > 0:
+            block = src.read(min(block_size, size))
+            if not block:
+                break
+            dst.write(block)
+            size -= len(block)
+
+
+class StreamingTranscriber:
+    """長時間錄音的串流處理：逐窗辨識，字幕與逐字稿邊處理邊寫入磁碟
+
+    每個時間窗處理完後即釋放音訊與片段，記憶體峰值只取決於時間窗長度，與錄音長度無關
+    """
+
+    def __init__(self, processor, window_seconds=600):
+        self.processor = processor
+        self.window_seconds = window_seconds
+
+    def run(self, file_path, output_formats=("srt", "srt_bilingual"), generate_transcript=True,
+            workspace=None):
+        """處理整個檔案，返回 {"language", "transcript", "subtitles"}
+
+        每個時間窗完成後保存進度，中斷後重新執行同一檔案時從下一個時間窗接續
+        """
+        checkpoint = None
+        try:
+            print(f"開始串流處理檔案：{file_path}")
+            input_path = Path(file_path).resolve()
+            if not input_path.exists():
+                raise FileNotFoundError(f"找不到檔案：{input_path}")
+
+            processor = self.processor
+            checkpoint = CheckpointStore(
+                f"{CheckpointStore.job_id_for(input_path)}_stream", processor.checkpoint_dir
+            ).acquire()
+
+            output_dir = processor.output_dir_for(workspace)
+            writer = None
+            if output_formats:
+                writer = SubtitleWriter(output_dir / "subtitles", input_path.stem, output_formats)
+            transcript_path = None
+            if generate_transcript:
+                transcript_path = output_dir / "transcripts" / f"{input_path.stem}_transcript.txt"
+                transcript_path.parent.mkdir(parents=True, exist_ok=True)
+
+            progress = self._restore_progress(checkpoint.load("progress"), transcript_path, writer)
+            start_window = progress["window"] if progress else 0
+            language = progress["language"] if progress else None
+            if progress:
+                print(f"從時間窗 {start_window + 1} 接續先前的進度")
+
+            # 所有格式都先轉成 16kHz 單聲道 WAV，才能逐窗讀取
+            temp_audio = processor.temp_dir_for(workspace) / f"{input_path.stem}_stream.wav"
+            processor.extract_audio(input_path, temp_audio)
+
+            if writer is not None:
+                writer.open(progress["subtitles"] if progress else None)
+
+            transcript_file = None
+            recording_id = None
+            if transcript_path is not None:
+                if progress:
+                    os.truncate(transcript_path, progress["transcript"]["offset"])
+                transcript_file = open(transcript_path, "a" if progress else "w", encoding="utf-8",
+                                       buffering=1 << 16)
+                recording_id = self._open_recording(input_path, transcript_path, progress)
+
+            subtitle_paths = {}
+            completed = False
+            try:
+                for window_index, (offset, audio) in enumerate(
+                        iter_audio_windows(temp_audio, self.window_seconds, start_window), start_window):
+                    print(f"處理時間窗 {window_index + 1}（{offset:.0f} 秒起）")
+                    result = processor.run_model(audio, language=language)
+                    del audio
+                    # 第一個時間窗偵測語言，之後沿用以保持一致
+                    language = language or result.get("language") or None
+                    segments = [
+                        Segment(s["start"] + offset, s["end"] + offset, s["text"].strip())
+                        for s in result["segments"]
+                    ]
+                    window_text = result["text"]
+                    del result
+                    if language in CHINESE_LANGUAGES:
+                        # 先轉為繁體，逐字稿、搜尋索引與字幕都使用繁體片段
+                        self._convert_segments(segments)
+
+                    if transcript_file is not None and window_text.strip():
+                        # 備用翻譯的中間結果只保存到時間窗寫入為止，檢查點大小不隨錄音長度增加
+                        window_checkpoint = CheckpointStore(f"window_{window_index}", checkpoint.job_dir)
+                        formatted_text = self._format_window(window_text, segments, language,
+                                                             window_checkpoint)
+                        if window_index > 0:
+                            transcript_file.write("\n\n")
+                        transcript_file.write(formatted_text)
+                        window_checkpoint.clear()
+                        if recording_id is not None:
+                            self._index_window(recording_id, formatted_text, segments)
+
+                    if writer is not None:
+                        self._translate_segments(segments, language)
+                        for segment in segments:
+                            writer.write_segment(segment)
+
+                    self._save_progress(checkpoint, window_index + 1, language, transcript_path,
+                                        transcript_file, writer)
+                completed = True
+            finally:
+                if writer is not None:
+                    if completed:
+                        subtitle_paths = writer.close()
+                    else:
+                        writer.suspend()
+                if transcript_file is not None:
+                    transcript_file.close()
+                if Path(temp_audio).exists():
+                    os.remove(temp_audio)
+                    print(f"已清理臨時音訊檔案：{temp_audio}")
+
+            checkpoint.clear()
+            return {
+                "language": language,
+                "transcript": str(transcript_path) if transcript_path else None,
+                "subtitles": subtitle_paths,
+            }
+
+        except Exception as e:
+            import traceback
+            print(f"錯誤堆疊：\n{traceback.format_exc()}")
+            raise Exception(f"串流處理失敗：{str(e)}")
+        finally:
+            if checkpoint is not None:
+                checkpoint.release()
+
+    def _save_progress(self, checkpoint, next_window, language, transcript_path, transcript_file, writer):
+        """保存已完成的時間窗數、逐字稿與字幕檔寫到的位元組位置與字幕序號"""
+        transcript = None
+        if transcript_file is not None:
+            transcript_file.flush()
+            transcript = {"path": str(transcript_path), "offset": transcript_file.tell()}
+        subtitles = None
+        if writer is not None:
+            subtitles = writer.state()
+            subtitles["paths"] = {fmt: str(path) for fmt, path in writer.paths.items()}
+        checkpoint.save("progress", {
+            "window": next_window,
+            "window_seconds": self.window_seconds,
+            "language": language,
+            "transcript": transcript,
+            "subtitles": subtitles,
+        })
+
+    def _restore_progress(self, progress, transcript_path, writer):
+        """檢查保存的進度是否可以接續，並將輸出檔案準備到保存的位置；無法接續時返回 None
+
+        新的工作目錄與先前不同時，將先前輸出檔案中已完成的部分複製到新的位置
+        """
+        if not progress or progress.get("window_seconds") != self.window_seconds:
+            return None
+        subtitles = progress.get("subtitles")
+        if (transcript_path is None) != (progress.get("transcript") is None):
+            return None
+        if (writer is None) != (subtitles is None):
+            return None
+        if writer is not None and set(subtitles["paths"]) != set(writer.paths):
+            return None
+
+        files = []
+        if transcript_path is not None:
+            files.append((progress["transcript"]["path"], transcript_path, progress["transcript"]["offset"]))
+        if writer is not None:
+            files.extend(
+                (subtitles["paths"][fmt], path, subtitles["offsets"][fmt]) for fmt, path in writer.paths.items()
+            )
+        for saved_path, _, offset in files:
+            if not Path(saved_path).exists() or os.path.getsize(saved_path) < offset:
+                print(f"先前的輸出檔案已不存在，重新處理：{saved_path}")
+                return None
+
+        for saved_path, path, offset in files:
+            if Path(saved_path).resolve() != Path(path).resolve():
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                _copy_head(saved_path, path, offset)
+        return progress
+
+    def _open_recording(self, input_path, transcript_path, progress):
+        """建立逐字稿的索引；接續先前的進度時沿用既有索引，移除未完成時間窗的內容"""
+        search_index = self.processor.search_index
+        try:
+            if progress:
+                recording_id = search_index.resume_recording(
+                    transcript_path, progress["window"] * self.window_seconds,
+                    previous_path=progress["transcript"]["path"]
+                )
+                if recording_id is not None:
+                    return recording_id
+            return search_index.add_recording(input_path.name, transcript_path, [], media_path=input_path)
+        except Exception as e:
+            print(f"更新搜尋索引失敗：{str(e)}")
+            return None
+
+    def _format_window(self, window_text, segments, language, checkpoint):
+        """格式化單一時間窗的逐字稿，規則與 transcribe_audio 相同"""
+        processor = self.processor
+        if language in CHINESE_LANGUAGES:
+            return processor.format_chinese_segments([segment.text for segment in segments] or [window_text])
+
+        translator = processor.translator
+        formatted_paragraphs = []
+        for chunk_index, chunk in enumerate(translator.split_into_chunks(window_text)):
+            pairs = None
+            if processor.combined_translation:
+                pairs = translator.segment_and_translate(chunk, language)
+            if pairs is None:
+                pairs = processor._translate_chunk_by_paragraph(
+                    translator, chunk, chunk_index, language, checkpoint
+                )
+            for translation_result in pairs:
+                formatted_paragraphs.append(translation_result['original'])
+                formatted_paragraphs.append(translation_result['translated'])
+                formatted_paragraphs.append('')  # 添加空行分隔段落
+        return '\n'.join(formatted_paragraphs).strip()
+
+    @staticmethod
+    def _convert_segments(segments):
+        """中文片段以本機 OpenCC 轉為繁體，規則與 export_subtitles 相同"""
+        from modules.translator import convert_to_traditional
+
+        for segment, text in zip(segments, convert_to_traditional(s.text for s in segments)):
+            segment.text = text
+
+    def _translate_segments(self, segments, language):
+        """非中文字幕片段翻譯為中文；中文片段已在辨識後轉為繁體"""
+        if language in CHINESE_LANGUAGES:
+            return
+
+        translator = self.processor.translator
+        for segment in segments:
+            segment.original_text = segment.text
+            segment.text = translator.translate_to_chinese(segment.text)
+
+    def _index_window(self, recording_id, formatted_text, segments):
+        try:
+            search_index = self.processor.search_index
+            search_index.add_entries(recording_id, search_index.transcript_entries(formatted_text, segments))
+        except Exception as e:
+            print(f"更新搜尋索引失敗：{str(e)}")
@@ -0,0 +1,146 @@
+import json
+import os
+from pathlib import Path
+
+# 支援的輸出格式與對應的檔名後綴
+SUPPORTED_FORMATS = {
+    "srt": ".srt",
+    "vtt": ".vtt",
+    "srt_bilingual": "_bilingual.srt",
+    "vtt_bilingual": "_bilingual.vtt",
+    "json": "_segments.json",
+    "txt": ".txt",
+}
+
+BILINGUAL_FORMATS = ("srt_bilingual", "vtt_bilingual")
+
+
+def format_timestamp(seconds, separator=","):
+    """將秒數轉換為字幕時間碼 (HH:MM:SS,mmm)"""
+    millis = int(round(max(seconds, 0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+class SubtitleWriter:
+    """單次走訪片段，同時輸出多種字幕與文字格式"""
+
+    def __init__(self, output_dir, stem, formats=("srt",), buffer_size=1 << 16):
+        unknown = [fmt for fmt in formats if fmt not in SUPPORTED_FORMATS]
+        if unknown:
+            raise ValueError(f"不支援的字幕格式：{', '.join(unknown)}")
+
+        self.output_dir = Path(output_dir)
+        self.stem = stem
+        self.formats = list(dict.fromkeys(formats))  # 去除重複並保留順序
+        self.buffer_size = buffer_size
+        self.paths = {fmt: self.output_dir / f"{stem}{SUPPORTED_FORMATS[fmt]}" for fmt in self.formats}
+        self._files = {}
+        self._index = 0
+        self._has_original = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def open(self, state=None):
+        """開啟所有輸出檔案並寫入檔頭
+
+        傳入 state() 保存的進度時，將檔案截斷到保存的位置後以附加模式接續寫入
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if state is not None:
+            self._index = state["index"]
+            self._has_original = state["has_original"]
+        for fmt, path in self.paths.items():
+            if state is not None:
+                os.truncate(path, state["offsets"][fmt])
+                self._files[fmt] = open(path, "a", encoding="utf-8", buffering=self.buffer_size)
+                continue
+            f = open(path, "w", encoding="utf-8", buffering=self.buffer_size)
+            if fmt.startswith("vtt"):
+                f.write("WEBVTT\n\n")
+            elif fmt == "json":
+                f.write("[")
+            self._files[fmt] = f
+        return self
+
+    def write_segment(self, segment):
+        """寫入單一片段到所有已開啟的格式"""
+        self._index += 1
+        start = segment["start"]
+        end = segment["end"]
+        text = segment["text"].strip()
+        original = (segment.get("original_text") or "").strip()
+        if original:
+            self._has_original = True
+
+        for fmt, f in self._files.items():
+            if fmt == "json":
+                entry = {"index": self._index, "start": start, "end": end, "text": text}
+                if original:
+                    entry["original_text"] = original
+                if self._index > 1:
+                    f.write(",")
+                f.write("\n  ")
+                f.write(json.dumps(entry, ensure_ascii=False))
+                continue
+
+            if fmt == "txt":
+                f.write(f"{text}\n")
+                continue
+
+            body = f"{original}\n{text}" if original and fmt in BILINGUAL_FORMATS else text
+            if fmt.startswith("srt"):
+                f.write(f"{self._index}\n"
+                        f"{format_timestamp(start)} --> {format_timestamp(end)}\n"
+                        f"{body}\n\n")
+            else:  # vtt
+                f.write(f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n"
+                        f"{body}\n\n")
+
+    def state(self):
+        """將緩衝寫入磁碟並返回目前進度（字幕序號與各檔案的位元組位置），供中斷後接續"""
+        offsets = {}
+        for fmt, f in self._files.items():
+            f.flush()
+            offsets[fmt] = f.tell()
+        return {"index": self._index, "has_original": self._has_original, "offsets": offsets}
+
+    def suspend(self):
+        """中斷時只關閉檔案，不寫入結尾也不刪除雙語字幕，保留給 open(state) 接續"""
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def close(self):
+        """關閉檔案並返回 {格式: 路徑}；沒有原文時不保留雙語字幕"""
+        for fmt, f in self._files.items():
+            if fmt == "json":
+                f.write("\n]\n" if self._index else "]\n")
+            f.close()
+        self._files = {}
+
+        if not self._has_original:
+            for fmt in BILINGUAL_FORMATS:
+                path = self.paths.pop(fmt, None)
+                if path is not None and path.exists():
+                    path.unlink()
+
+        return {fmt: str(path) for fmt, path in self.paths.items()}
+
+    def write_all(self, segments):
+        """一次寫入所有片段並返回輸出路徑"""
+        self.open()
+        try:
+            for segment in segments:
+                self.write_segment(segment)
+        finally:
+            paths = self.close()
+        return paths
@@ -0,0 +1,206 @@
+import os
+import re
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+# 中日韓文字（假名、漢字、諺文）的字元範圍
+_CJK_RANGES = '぀-ヿ㐀-䶿一-鿿가-힯豈-﫿'
+# 中日韓文字以連續字元的二元組切詞，其他文字以單字切詞；單字不包含中日韓文字，
+# 否則「2024年度報告」、「iPhone拍照」這類混合文字會整段被當成一個單字
+_TOKEN_PATTERN = re.compile(rf'[{_CJK_RANGES}]+|[^\W_{_CJK_RANGES}]+')
+_CJK_PATTERN = re.compile(rf'[{_CJK_RANGES}]')
+
+
+def cjk_bigrams(text):
+    """將文字切成搜尋用的詞元：中日韓文字取二元組，其他文字取小寫單字"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def split_paragraphs(text):
+    """以空行切分逐字稿段落"""
+    return [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+
+
+class TranscriptIndex:
+    """逐字稿段落的倒排索引，建立一次後即可快速搜尋"""
+
+    def __init__(self, paragraphs):
+        self.paragraphs = list(paragraphs)
+        self._lowered = [p.lower() for p in self.paragraphs]
+        self.postings = {}
+        for index, paragraph in enumerate(self.paragraphs):
+            # 單一中日韓字元也建立索引，單字查詢不需要掃描二元組
+            tokens = set(cjk_bigrams(paragraph)) | set(_CJK_PATTERN.findall(paragraph))
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(index)
+        # 其他文字的單字排序後保存，查詢時以前綴比對找出只輸入一部分的單字
+        self._words = sorted(token for token in self.postings if not _CJK_PATTERN.match(token))
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(split_paragraphs(text))
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+    def get_paragraphs(self, start, end):
+        return self.paragraphs[start:end]
+
+    def _lookup(self, token):
+        """查詢詞元對應的段落；中日韓詞元直接查索引，其他單字以排序後的詞彙表做前綴比對"""
+        if _CJK_PATTERN.match(token):
+            return self.postings.get(token, set())
+        matches = set()
+        position = bisect_left(self._words, token)
+        while position < len(self._words) and self._words[position].startswith(token):
+            matches |= self.postings[self._words[position]]
+            position += 1
+        return matches
+
+    def search(self, query, limit=None):
+        """返回包含查詢字串的段落索引（依出現順序）"""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        tokens = set(cjk_bigrams(query))
+        if tokens:
+            candidates = None
+            for token in tokens:
+                matches = self._lookup(token)
+                if not matches:
+                    return []
+                candidates = set(matches) if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+        else:
+            # 查詢只有標點符號時退回逐段比對
+            candidates = range(len(self.paragraphs))
+
+        # 以原文比對排除詞元順序不同的誤判
+        results = [i for i in sorted(candidates) if query in self._lowered[i]]
+        return results[:limit] if limit else results
+
+
+class TranscriptFile:
+    """磁碟上的逐字稿，只保存每個段落的起始位置，依頁從檔案讀取段落
+
+    長時間錄音的逐字稿不需要整份讀入記憶體，記憶體用量只與段落數有關
+    """
+
+    def __init__(self, path, search_index=None):
+        self.path = Path(path)
+        # 串流處理時建立的全文索引（TranscriptSearchIndex），搜尋時不需掃描整份檔案
+        self.search_index = search_index
+        self._load()
+
+    def _load(self):
+        self.offsets = array('q', (offset for offset, _ in self._iter_paragraphs()))
+        self._last_search = None
+
+    def _iter_paragraphs(self, offset=0):
+        """從指定位置逐段讀取，產生 (段落起始位置, 段落各行)"""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            start = None
+            lines = []
+            for line in f:
+                if line.strip():
+                    if start is None:
+                        start = offset
+                    lines.append(line)
+                elif start is not None:
+                    yield start, lines
+                    start = None
+                    lines = []
+                offset += len(line)
+            if start is not None:
+                yield start, lines
+
+    @staticmethod
+    def _decode(lines):
+        return b''.join(lines).decode("utf-8").replace('\r\n', '\n').strip()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get_paragraphs(self, start, end):
+        """讀取第 start 到 end（不含）個段落"""
+        end = min(end, len(self.offsets))
+        if start >= end:
+            return []
+        paragraphs = []
+        for _, lines in self._iter_paragraphs(self.offsets[start]):
+            paragraphs.append(self._decode(lines))
+            if len(paragraphs) >= end - start:
+                break
+        return paragraphs
+
+    def search(self, query, limit=None):
+        """返回包含查詢字串的段落索引；保留最近一次查詢的結果
+
+        以全文索引查詢此逐字稿的段落，沒有索引或索引無法查詢時才逐段讀取檔案比對
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        if self._last_search is None or self._last_search[0] != query:
+            results = None
+            if self.search_index is not None:
+                try:
+                    results = self.search_index.find_paragraphs(self.path, query)
+                except Exception as e:
+                    print(f"搜尋索引查詢失敗：{str(e)}")
+            if results is None:
+                results = [
+                    index for index, (_, lines) in enumerate(self._iter_paragraphs())
+                    if query in self._decode(lines).lower()
+                ]
+            self._last_search = (query, results)
+        results = self._last_search[1]
+        return results[:limit] if limit else results
+
+    def replace_paragraphs(self, start, end, paragraphs):
+        """以新的段落取代第 start 到 end（不含）個段落，逐段複製到暫存檔後替換原檔"""
+        end = min(end, len(self.offsets))
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            head = self.offsets[start] if start < len(self.offsets) else os.path.getsize(self.path)
+            self._copy(src, dst, head)
+            if paragraphs and start > 0 and head == os.path.getsize(self.path):
+                dst.write(b"\n\n")
+            dst.write('\n\n'.join(paragraphs).encode("utf-8"))
+            if end < len(self.offsets):
+                if paragraphs:
+                    dst.write(b"\n\n")
+                src.seek(self.offsets[end])
+                self._copy(src, dst)
+        os.replace(tmp_path, self.path)
+        self._load()
+        if self.search_index is not None:
+            try:
+                self.search_index.replace_paragraphs(self.path, start, end, paragraphs)
+            except Exception as e:
+                print(f"更新搜尋索引失敗：{str(e)}")
+
+    @staticmethod
+    def _copy(src, dst, size=None, block_size=1 << 16):
+        remaining = size
+        while remaining is None or remaining > 0:
+            block = src.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            dst.write(block)
+            if remaining is not None:
+                remaining -= len(block)
@@ -0,0 +1,213 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+# 使用中標記的更新間隔；超過 LOCK_TIMEOUT_SECONDS 未更新即視為處理程序已中斷
+HEARTBEAT_SECONDS = 60
+LOCK_TIMEOUT_SECONDS = 10 * 60
+
+
+class Heartbeat:
+    """在背景定期更新標記檔的修改時間，表示持有者仍在執行"""
+
+    def __init__(self, path, interval_seconds=HEARTBEAT_SECONDS):
+        self.path = Path(path)
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def beat(self):
+        try:
+            self.path.touch()
+        except OSError:
+            pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.beat()
+
+    def start(self):
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def lock_is_alive(lock_path, now=None, timeout_seconds=LOCK_TIMEOUT_SECONDS):
+    """使用中標記存在且在逾時時間內更新過"""
+    try:
+        return (now or time.time()) - Path(lock_path).stat().st_mtime < timeout_seconds
+    except OSError:
+        return False
+
+
+class JobWorkspace:
+    """單一工作的獨立工作目錄，避免不同使用者的同名檔案互相覆蓋"""
+
+    LOCK_FILE = ".in_use"
+    STAMP_FILE = ".last_used"
+
+    def __init__(self, root=Path("workspace"), job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.root = Path(root) / self.job_id
+        self.input_dir = self.root / "input"
+        self.temp_dir = self.root / "temp"
+        self.output_dir = self.root / "output"
+
+    def create(self):
+        """建立工作目錄結構"""
+        for dir_path in [self.input_dir, self.temp_dir,
+                         self.output_dir / "transcripts",
+                         self.output_dir / "subtitles"]:
+            dir_path.mkdir(parents=True, exist_ok=True)
+        self.touch()
+        return self
+
+    def touch(self):
+        """更新最後使用時間，讓清理程式以此判斷是否過期"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / self.STAMP_FILE).touch()
+
+    @contextmanager
+    def in_use(self):
+        """處理期間標記為使用中並持續更新標記，清理程式不會刪除使用中的工作目錄"""
+        self.create()
+        lock_path = self.root / self.LOCK_FILE
+        heartbeat = Heartbeat(lock_path).start()
+        try:
+            yield self
+        finally:
+            heartbeat.stop()
+            if lock_path.exists():
+                lock_path.unlink()
+            self.touch()
+
+    def remove(self):
+        """刪除整個工作目錄"""
+        if self.root.exists():
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+def directory_size(path):
+    """計算目錄下所有檔案的大小（位元組）"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class WorkspaceJanitor:
+    """背景清理工作目錄：刪除超過 TTL 的目錄，並在超過磁碟配額時由最久未使用者開始淘汰
+
+    指定 checkpoint_root 時，中斷工作留下的檢查點目錄也一併套用 TTL 與配額；
+    on_remove 會在每個目錄刪除後以該目錄路徑呼叫，供清除指向它的索引等資料
+    """
+
+    def __init__(self, root=Path("workspace"), ttl_seconds=6 * 3600,
+                 max_total_bytes=10 * 1024 ** 3, interval_seconds=300,
+                 lock_timeout_seconds=LOCK_TIMEOUT_SECONDS, checkpoint_root=None, on_remove=None):
+        self.root = Path(root)
+        self.on_remove = on_remove
+        self.checkpoint_root = Path(checkpoint_root) if checkpoint_root is not None else None
+        self.ttl_seconds = ttl_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self.max_total_bytes = max_total_bytes
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _last_used(self, job_dir):
+        stamp = job_dir / JobWorkspace.STAMP_FILE
+        try:
+            return (stamp if stamp.exists() else job_dir).stat().st_mtime
+        except OSError:
+            return 0
+
+    def _in_use(self, job_dir, now):
+        # 處理中的工作會持續更新使用中標記，標記停止更新才視為處理程序已中斷，允許清理
+        return lock_is_alive(job_dir / JobWorkspace.LOCK_FILE, now, self.lock_timeout_seconds)
+
+    def _job_dirs(self):
+        for root in [self.root, self.checkpoint_root]:
+            if root is None or not root.exists():
+                continue
+            for job_dir in root.iterdir():
+                if job_dir.is_dir():
+                    yield job_dir
+
+    def _remove(self, job_dir):
+        shutil.rmtree(job_dir, ignore_errors=True)
+        if self.on_remove is not None:
+            try:
+                self.on_remove(job_dir)
+            except Exception as e:
+                print(f"清理工作目錄的相關資料失敗：{str(e)}")
+
+    def sweep(self):
+        """執行一次清理，返回清理後的總使用量（位元組）"""
+        with self._lock:
+            now = time.time()
+            jobs = []
+            for job_dir in self._job_dirs():
+                last_used = self._last_used(job_dir)
+                in_use = self._in_use(job_dir, now)
+                if not in_use and now - last_used > self.ttl_seconds:
+                    print(f"清理過期工作目錄：{job_dir}")
+                    self._remove(job_dir)
+                    continue
+                jobs.append((last_used, in_use, job_dir, directory_size(job_dir)))
+
+            total = sum(size for _, _, _, size in jobs)
+            # 超過配額時，由最久未使用的工作開始淘汰
+            for last_used, in_use, job_dir, size in sorted(jobs, key=lambda job: job[0]):
+                if total <= self.max_total_bytes:
+                    break
+                if in_use:
+                    continue
+                print(f"磁碟配額不足，淘汰工作目錄：{job_dir}")
+                self._remove(job_dir)
+                total -= size
+
+            return total
+
+    def ensure_capacity(self, required_bytes):
+        """確認還有足夠空間開始新工作，必要時先清理；空間仍不足時拋出例外"""
+        total = self.sweep()
+        if total + required_bytes > self.max_total_bytes:
+            raise Exception(
+                f"暫存空間不足：已使用 {total / 1024 ** 2:.0f} MB，"
+                f"需要 {required_bytes / 1024 ** 2:.0f} MB，"
+                f"上限 {self.max_total_bytes / 1024 ** 2:.0f} MB，請稍後再試"
+            )
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"清理工作目錄失敗：{str(e)}")
+
+    def start(self):
+        """啟動背景清理執行緒，重複呼叫只會啟動一次"""
+        if self._thread is None:
+            self.sweep()
+            self._thread = threading.Thread(target=self._run, name="workspace-janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,43 @@
+from modules.processor import AudioVideoProcessor
+from modules import translator
+from modules.translator import contains_non_chinese, convert_to_traditional
+
+
+def test_contains_non_chinese_counts_foreign_words():
+    assert not contains_non_chinese('我們今天討論 Kubernetes 和 Docker 的部署方式')
+    assert contains_non_chinese('This is an English sentence about 中文')
+    assert contains_non_chinese('안녕하세요 여러분 반갑습니다')
+    assert contains_non_chinese('今日はいい天気です')
+
+
+def test_unpunctuated_segments_are_split_into_paragraphs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = AudioVideoProcessor()
+    texts = [f'这是第{i}个没有标点的片段内容' for i in range(200)]
+
+    paragraphs = processor.format_chinese_segments(texts).split('\n\n')
+
+    assert len(paragraphs) > 50
+    assert max(len(p) for p in paragraphs) <= 200
+    assert '這是第0個沒有標點的片段內容。' in paragraphs[0]
+
+
+def test_trailing_soft_punctuation_becomes_full_stop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = AudioVideoProcessor()
+    texts = ['我们今天讨论预算，', '还有报告的部分、', '下周再确认;', '最后是结论：', '好的。', '，']
+
+    formatted = processor.format_chinese_segments(texts)
+
+    for soft in '，、；,;:：':
+        assert soft + '。' not in formatted
+    assert formatted.replace('\n', '') == '我們今天討論預算。還有報告的部分。下週再確認。最後是結論。好的。'
+
+
+def test_single_worker_converts_without_process_pool(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("只有一個工作行程時不應啟動行程池")
+
+    monkeypatch.setattr(translator, "ProcessPoolExecutor", no_pool)
+
+    assert convert_to_traditional(['这是', '测试'], parallel_threshold=0, max_workers=1) == ['這是', '測試']
@@ -0,0 +1,66 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from modules.processor import AudioVideoProcessor
+
+
+class FakeModel:
+    """記錄同時執行的 transcribe 數量"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return {"text": "測試", "language": "zh", "segments": []}
+
+
+def test_shared_model_runs_one_inference_at_a_time(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    monkeypatch.chdir(tmp_path)
+    processor = AudioVideoProcessor()
+    model = FakeModel()
+    processor._model = model
+
+    threads = [threading.Thread(target=processor.run_model, args=("audio.wav",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert model.max_active == 1
+
+
+def test_transcript_and_subtitles_share_one_recognition(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = AudioVideoProcessor()
+    calls = []
+
+    def run_model(audio, language=None):
+        calls.append(audio)
+        return {
+            "text": "今天讨论预算",
+            "language": "zh",
+            "segments": [{"start": 0.0, "end": 2.0, "text": "今天讨论预算"}],
+        }
+
+    monkeypatch.setattr(processor, "run_model", run_model)
+    audio = tmp_path / "meeting.wav"
+    audio.write_bytes(b"RIFF" + b"\0" * 64)
+
+    processor.transcribe_audio(str(audio), keep_recognition=True)
+    paths = processor.export_subtitles(str(audio), ["srt"])
+
+    assert len(calls) == 1
+    assert "今天討論預算" in Path(paths["srt"]).read_text(encoding="utf-8")
+    assert not processor.recognition_checkpoint(audio).job_dir.exists()
@@ -0,0 +1,50 @@
+from modules.processor import AudioVideoProcessor
+from modules.search_index import TranscriptSearchIndex
+
+
+def make_index(tmp_path):
+    index = TranscriptSearchIndex(tmp_path / "search_index.db")
+    segments = [
+        {"start": 0.0, "end": 4.0, "text": "2024年度報告很好"},
+        {"start": 4.0, "end": 8.0, "text": "我用iPhone拍照"},
+    ]
+    transcript_path = tmp_path / "workspace" / "job" / "output" / "transcripts" / "a_transcript.txt"
+    index.index_transcript("a.mp3", transcript_path, "2024年度報告很好\n\n我用iPhone拍照", segments)
+    return index
+
+
+def test_search_mixed_script_text(tmp_path):
+    index = make_index(tmp_path)
+    for query, start in [("報告", 0.0), ("很好", 0.0), ("拍照", 4.0), ("iphone", 4.0), ("2024", 0.0)]:
+        hits = index.search(query)
+        assert hits, query
+        assert hits[0]["start"] == start
+
+
+def test_remove_recordings_under_workspace(tmp_path):
+    index = make_index(tmp_path)
+    assert index.remove_recordings_under(tmp_path / "workspace" / "other") == 0
+    assert index.search("報告")
+
+    assert index.remove_recordings_under(tmp_path / "workspace" / "job") == 1
+    assert index.search("報告") == []
+    assert index.search("iphone") == []
+
+
+def test_simplified_segments_match_traditional_query(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = AudioVideoProcessor()
+    result = {
+        "text": "我们讨论预算报告",
+        "language": "zh",
+        "segments": [
+            {"start": 0.0, "end": 3.0, "text": "我们讨论"},
+            {"start": 3.0, "end": 6.0, "text": "预算报告"},
+        ],
+    }
+    transcript_path = tmp_path / "b_transcript.txt"
+    processor.index_transcript(tmp_path / "b.mp3", transcript_path, "我們討論預算報告。", result)
+
+    hits = [hit for hit in processor.search_index.search("預算報告") if hit["kind"] == "segment"]
+    assert hits
+    assert hits[0]["start"] == 3.0
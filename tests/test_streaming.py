@@ -0,0 +1,131 @@
+import shutil
+import tracemalloc
+import wave
+
+import pytest
+
+from modules.processor import AudioVideoProcessor
+from modules.streaming import SAMPLE_RATE, StreamingTranscriber
+from modules.workspace import JobWorkspace
+
+WINDOW_SECONDS = 60
+PEAK_LIMIT_BYTES = 16 * 1024 ** 2
+
+
+def write_silence(path, minutes):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for _ in range(minutes):
+            wav.writeframes(b"\x00\x00" * SAMPLE_RATE * 60)
+
+
+def fake_run_model(audio, language=None):
+    """每 5 秒產生一個片段，取代 Whisper 推論"""
+    duration = int(len(audio) / SAMPLE_RATE)
+    segments = [
+        {"start": float(t), "end": float(t + 5), "text": f"第{t}秒的测试内容"}
+        for t in range(0, duration, 5)
+    ]
+    return {"text": "".join(s["text"] for s in segments), "language": "zh", "segments": segments}
+
+
+def make_processor(monkeypatch):
+    processor = AudioVideoProcessor()
+    monkeypatch.setattr(processor, "run_model", fake_run_model)
+    # 輸入已是 16kHz 單聲道 WAV，不需要 FFmpeg 轉檔
+    monkeypatch.setattr(processor, "extract_audio", lambda src, dst: shutil.copyfile(src, dst))
+    return processor
+
+
+def peak_memory(processor, path):
+    transcriber = StreamingTranscriber(processor, window_seconds=WINDOW_SECONDS)
+    tracemalloc.start()
+    try:
+        outputs = transcriber.run(path, output_formats=("srt", "json"))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return outputs, peak
+
+
+def test_streaming_peak_memory_does_not_grow_with_duration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = make_processor(monkeypatch)
+
+    # 先處理一段短錄音，讓 OpenCC 字典與搜尋索引在量測前載入
+    write_silence(tmp_path / "warm_up.wav", 1)
+    peak_memory(processor, tmp_path / "warm_up.wav")
+
+    write_silence(tmp_path / "short.wav", 10)
+    write_silence(tmp_path / "long.wav", 60)
+    short_outputs, short_peak = peak_memory(processor, tmp_path / "short.wav")
+    long_outputs, long_peak = peak_memory(processor, tmp_path / "long.wav")
+
+    assert short_peak < PEAK_LIMIT_BYTES
+    assert long_peak < PEAK_LIMIT_BYTES
+    assert long_peak < short_peak * 1.2
+
+    with open(long_outputs["subtitles"]["srt"], encoding="utf-8") as f:
+        assert f.read().count(" --> ") == 60 * 60 // 5
+    with open(long_outputs["transcript"], encoding="utf-8") as f:
+        assert f.read().count("第55秒的測試內容") == 60
+
+
+def test_streaming_indexes_traditional_segments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = make_processor(monkeypatch)
+    write_silence(tmp_path / "meeting.wav", 1)
+
+    StreamingTranscriber(processor, window_seconds=WINDOW_SECONDS).run(tmp_path / "meeting.wav")
+
+    hits = [hit for hit in processor.search_index.search("第55秒的測試內容") if hit["kind"] == "segment"]
+    assert [hit["start"] for hit in hits] == [55.0]
+
+
+def read_outputs(outputs):
+    files = [outputs["transcript"], *outputs["subtitles"].values()]
+    contents = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            contents.append(f.read())
+    return contents
+
+
+def test_streaming_resumes_after_interruption(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = make_processor(monkeypatch)
+    write_silence(tmp_path / "meeting.wav", 5)
+    transcriber = StreamingTranscriber(processor, window_seconds=WINDOW_SECONDS)
+
+    def run(job_id):
+        workspace = JobWorkspace(job_id=job_id).create()
+        return transcriber.run(tmp_path / "meeting.wav", ("srt", "srt_bilingual", "json"), workspace=workspace)
+
+    expected = read_outputs(run("full"))
+
+    windows = []
+
+    def counting_run_model(audio, language=None):
+        windows.append(len(audio))
+        if interrupt and len(windows) == 3:
+            raise RuntimeError("中斷")
+        return fake_run_model(audio, language)
+
+    monkeypatch.setattr(processor, "run_model", counting_run_model)
+    interrupt = True
+    with pytest.raises(Exception):
+        run("first")
+
+    # 重新啟動後使用新的工作目錄，從第三個時間窗接續
+    windows.clear()
+    interrupt = False
+    outputs = run("second")
+
+    assert len(windows) == 3
+    assert read_outputs(outputs) == expected
+    assert "second" in outputs["transcript"]
+    hits = [hit for hit in processor.search_index.search("第55秒的測試內容") if hit["kind"] == "segment"]
+    assert sorted(hit["start"] for hit in hits if "second" in hit["transcript_path"]) == \
+        [55.0 + 60 * i for i in range(5)]
@@ -0,0 +1,47 @@
+from modules.search_index import TranscriptSearchIndex
+from modules.transcript_index import TranscriptFile, TranscriptIndex, cjk_bigrams
+
+
+def test_cjk_bigrams_split_mixed_script_runs():
+    assert cjk_bigrams('2024年度報告很好') == ['2024', '年度', '度報', '報告', '告很', '很好']
+    assert cjk_bigrams('我用iPhone拍照') == ['我用', 'iphone', '拍照']
+
+
+def test_search_finds_chinese_after_latin_or_digits():
+    index = TranscriptIndex(['2024年度報告很好', '我用iPhone拍照', '今天天氣很好'])
+    assert index.search('報告') == [0]
+    assert index.search('年度') == [0]
+    assert index.search('拍照') == [1]
+    assert index.search('很好') == [0, 2]
+    assert index.search('2024年') == [0]
+
+
+def test_search_single_character_and_word_prefix():
+    index = TranscriptIndex(['我用iPhone拍照', 'Kubernetes deployment notes', '部署方式'])
+    assert index.search('照') == [0]
+    assert index.search('iphone') == [0]
+    assert index.search('kube') == [1]
+    assert index.search('kubernetes deploy') == [1]
+    assert index.search('docker') == []
+
+
+def test_transcript_file_searches_through_index(tmp_path):
+    paragraphs = [f'第{i}段討論預算' if i % 3 == 0 else f'第{i}段其他內容' for i in range(10)]
+    path = tmp_path / "a_transcript.txt"
+    path.write_text('\n\n'.join(paragraphs), encoding="utf-8")
+    search_index = TranscriptSearchIndex(tmp_path / "search_index.db")
+    recording_id = search_index.add_recording("a.mp3", path, [])
+    # 串流處理逐窗寫入段落
+    for window in (paragraphs[:5], paragraphs[5:]):
+        search_index.add_entries(recording_id, search_index.transcript_entries('\n\n'.join(window), []))
+
+    transcript = TranscriptFile(path, search_index)
+    scan = transcript._iter_paragraphs
+    transcript._iter_paragraphs = None  # 搜尋不應逐段讀取檔案
+    assert transcript.search('預算') == [0, 3, 6, 9]
+    assert transcript.search('第3段') == [3]
+
+    transcript._iter_paragraphs = scan
+    transcript.replace_paragraphs(1, 3, ['修改後的預算'])
+    assert transcript.search('預算') == [0, 1, 2, 5, 8]
+    assert transcript.search('其他內容') == TranscriptFile(path).search('其他內容')